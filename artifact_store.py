@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+###########################################################################################################
+# packed store for the per-site outputs ({website}.html, {website}-error.txt, {website}-sslscan.json and the
+# testssl.sh reports), instead of tens of thousands of loose files in the date directory
+# with scirtscan.py --artifacts every file is written zlib compressed into one SQLite file (artifacts.db)
+# in the date directory. Appending to a file adds a chunk, so the detailed log can still be written in parts
+# by the checks, the testssl.sh batch and the SSL Labs rounds. The links in index.html keep working when the
+# date directory is served with:
+#   ./artifact_store.py 20241018 --serve 8000
+# and the loose files can be written out again with:
+#   ./artifact_store.py 20241018 --extract
+# 20241018
+###########################################################################################################
+import argparse
+import http.server
+import io
+import mimetypes
+import os
+import sqlite3
+import sys
+import threading
+import zlib
+from urllib.parse import unquote, urlparse
+
+ARTIFACTS_DB = "artifacts.db"
+COMPRESS_LEVEL = 6
+
+_store = None       # the installed store, None means loose files
+
+class ArtifactStore:
+    """
+    Args:
+    path (str): The SQLite file with the artifacts (usually YYYYMMDD/artifacts.db).
+    logger (function pointer): Function to print debug information.
+    """
+
+    def __init__(self, path, logger=print):
+        self.path = path
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS artifacts
+        (
+            name TEXT,                      -- file name, as linked from the detailed log and index.html
+            seq INTEGER,                    -- chunks of a file are concatenated in this order
+            size INT,                       -- uncompressed size of the chunk
+            data BLOB,                      -- zlib compressed chunk
+            PRIMARY KEY (name, seq)
+        )
+        ''')
+        self.conn.commit()
+
+    def write(self, name, data, append=False):
+        """
+        Stores data (str or bytes) as the contents of name, or as a chunk added to it when append is True.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.lock:
+            with self.conn:
+                if not append:
+                    self.conn.execute("DELETE FROM artifacts WHERE name = ?", (name,))
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq) + 1, 0) FROM artifacts WHERE name = ?", (name,)).fetchone()[0]
+                self.conn.execute("INSERT INTO artifacts (name, seq, size, data) VALUES (?, ?, ?, ?)",
+                                  (name, seq, len(data), zlib.compress(data, COMPRESS_LEVEL)))
+
+    def read(self, name):
+        """
+        Returns the contents of name as bytes, or None if it isn't in the store.
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT data FROM artifacts WHERE name = ? ORDER BY seq", (name,)).fetchall()
+        if not rows:
+            return None
+        return b"".join(zlib.decompress(data) for data, in rows)
+
+    def names(self):
+        with self.lock:
+            return [name for name, in self.conn.execute("SELECT DISTINCT name FROM artifacts ORDER BY name")]
+
+    def open(self, name, mode="r"):
+        """
+        Returns a text file object for name, what is written to it is stored when it is flushed or closed.
+        """
+        if mode == "r":
+            data = self.read(name)
+            if data is None:
+                raise FileNotFoundError(f"{name} not in {self.path}")
+            return io.StringIO(data.decode("utf-8", errors="replace"))
+        if mode not in ["w", "a"]:
+            raise ValueError(f"unsupported mode {mode}")
+        return ArtifactFile(self, name, mode == "a")
+
+    def pack(self, path):
+        """
+        Moves a file that was written by another program (e.g. testssl.sh) into the store.
+        """
+        try:
+            with open(path, "rb") as f:
+                self.write(os.path.basename(path), f.read())
+            os.remove(path)
+        except OSError as e:
+            self.logger(f"unable to add {path} to {self.path}: {e}")
+
+    def install(self):
+        """
+        Makes open_artifact and pack_artifact use this store.
+        """
+        global _store
+        _store = self
+
+    def uninstall(self):
+        global _store
+        if _store is self:
+            _store = None
+
+    def statistics(self):
+        with self.lock:
+            files, size, packed = self.conn.execute("SELECT COUNT(DISTINCT name), SUM(size), SUM(LENGTH(data)) FROM artifacts").fetchone()
+        return f"artifacts: {files} files, {size or 0} bytes in {packed or 0} bytes compressed"
+
+    def close(self):
+        self.uninstall()
+        with self.lock:
+            self.conn.close()
+
+class ArtifactFile(io.StringIO):
+    """
+    In-memory text file, its contents go to the artifact store when it is flushed or closed.
+    """
+
+    def __init__(self, store, name, append):
+        super().__init__()
+        self.store = store
+        self.name = name
+        self.append = append
+
+    def flush(self):
+        """
+        Stores what was written since the last flush as a chunk and empties the buffer.
+        """
+        if not self.closed:
+            data = self.getvalue()
+            if data or not self.append:
+                self.store.write(self.name, data, self.append)
+                self.append = True      # the rest is added to what is stored now
+            self.seek(0)
+            self.truncate()
+        super().flush()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+def open_artifact(directory_path, name, mode="r"):
+    """
+    Opens a per-site output file, in the installed artifact store or as a loose file in directory_path.
+    """
+    if _store is not None:
+        return _store.open(name, mode)
+    return open(os.path.join(directory_path, name), mode)
+
+def pack_artifact(path):
+    """
+    Moves a loose file into the installed artifact store, does nothing if there is none.
+    """
+    if _store is not None and os.path.exists(path):
+        _store.pack(path)
+
+###########################################################################################################
+# serve a date directory, files that aren't there are looked up in artifacts.db
+###########################################################################################################
+def serve(directory_path, store, port):
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            # the parent directory, so ../styles.css and ../sort.js of index.html are found
+            super().__init__(*args, directory=os.path.dirname(os.path.abspath(directory_path)), **kwargs)
+
+        def do_GET(self):
+            path = unquote(urlparse(self.path).path)
+            directory, name = os.path.split(path.strip("/"))
+            if directory == os.path.basename(os.path.abspath(directory_path)) and name:
+                if not os.path.exists(os.path.join(directory_path, name)):
+                    data = store.read(name)
+                    if data is not None:
+                        self.send_response(200)
+                        self.send_header("Content-Type", mimetypes.guess_type(name)[0] or "text/plain")
+                        self.send_header("Content-Length", str(len(data)))
+                        self.end_headers()
+                        self.wfile.write(data)
+                        return
+            super().do_GET()
+
+    server = http.server.ThreadingHTTPServer(("", port), Handler)
+    print(f"serving http://localhost:{port}/{os.path.basename(os.path.abspath(directory_path))}/index.html")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description='serve, list or extract the per-site outputs in the artifacts.db of a date directory')
+    parser.add_argument('path', help='the date directory (YYYYMMDD)')
+    parser.add_argument('-s', '--serve', type=int, metavar='PORT', help='serve the date directory with the artifacts on this port')
+    parser.add_argument('-x', '--extract', action='store_true', help='write the artifacts as loose files into the date directory')
+    parser.add_argument('-l', '--list', action='store_true', help='list the artifacts')
+    args = parser.parse_args()
+
+    database = os.path.join(args.path, ARTIFACTS_DB)
+    if not os.path.exists(database):
+        sys.exit(f"{database} does not exist")
+    store = ArtifactStore(database)
+
+    if args.list:
+        for name in store.names():
+            print(name)
+    if args.extract:
+        for name in store.names():
+            with open(os.path.join(args.path, name), "wb") as f:
+                f.write(store.read(name))
+        print(f"{len(store.names())} files written to {args.path}")
+    if args.serve:
+        serve(args.path, store, args.serve)
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+###########################################################################################################
+# benchmark for sql2excel.py and sql2csv.py: exports generated databases of increasing size and reports the
+# time and peak memory of every export, the peak memory should stay flat as the number of rows grows.
+#   ./benchmarks/bench_exports.py
+#   ./benchmarks/bench_exports.py -n 10000 100000 500000
+# 20241018
+###########################################################################################################
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from bench_sql2html import REPO, create_database
+
+def run(command):
+    """
+    Runs an exporter, returns (seconds, peak RSS in MiB).
+    """
+    start = time.monotonic()
+    process = subprocess.Popen([sys.executable] + command, cwd=REPO, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.monotonic() - start
+    if status != 0:
+        sys.exit(f"{command[0]} failed with status {status}")
+    return seconds, usage.ru_maxrss / 1024     # ru_maxrss is in KiB on Linux
+
+def main():
+    parser = argparse.ArgumentParser(description='measure the time and memory sql2excel.py and sql2csv.py need for large databases')
+    parser.add_argument('-n', '--rows', type=int, nargs='+', default=[10000, 100000, 500000], help='database sizes (default: 10000 100000 500000)')
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        directory = tempfile.mkdtemp(prefix="bench_exports_")
+        try:
+            database = os.path.join(directory, "websites.db")
+            create_database(database, rows)
+            for name, command in [("sql2excel.py", ["sql2excel.py", "-p", directory]), ("sql2csv.py", ["sql2csv.py", database])]:
+                seconds, peak = run(command)
+                print(f"{name}: {rows} rows in {seconds:.2f} seconds, peak RSS {peak:.0f} MiB")
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+###########################################################################################################
+# benchmark for sql2html.py: fills a websites.db with generated results (100k rows by default) and reports
+# the generation time and peak memory of sql2html.py. With --compare another version of sql2html.py is run
+# on the same database and the two index.html files are compared.
+#   ./benchmarks/bench_sql2html.py
+#   ./benchmarks/bench_sql2html.py -n 200000 --compare /tmp/sql2html_old.py
+# 20241018
+###########################################################################################################
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+from columns import COLUMNS, create_table_sql, structure
+
+def create_database(path, rows, seed=1):
+    """
+    Creates websites.db with rows generated results, with the unknown (NULL) values the scanner leaves behind.
+    """
+    rng = random.Random(seed)
+    verdict = lambda i: rng.choice([1, 1, 1, 0, None])
+    # a value for each column, by how the column is rendered
+    values = {"website": lambda i: f"www{i}.example{i % 97}.nl", "verdict": verdict, "verdict_black": verdict, "security_txt": verdict,
+              "grade": lambda i: rng.choice(["A+", "A", "B", "T", None]), "days": lambda i: rng.choice([None, rng.randint(-10, 400)]),
+              "hsts": lambda i: rng.choice([None, 0, 180, 365, 730]), "check_date": lambda i: "2024-10-18_10:00:00", "value": lambda i: None}
+    generators = [values[column.render] for column in COLUMNS]
+    conn = sqlite3.connect(path)
+    conn.execute(create_table_sql())
+    conn.execute("CREATE TABLE meta (structure TEXT, version TEXT)")
+    conn.execute("INSERT INTO meta (structure) VALUES (?)", (structure(),))
+    conn.executemany(f"INSERT INTO website_checks ({', '.join(column.name for column in COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                     (tuple(generate(i) for generate in generators) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+def run(script, directory):
+    """
+    Runs a sql2html.py on directory, returns (seconds, peak RSS in MiB).
+    """
+    start = time.monotonic()
+    process = subprocess.Popen([sys.executable, script, "-p", directory], cwd=REPO, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.monotonic() - start
+    if status != 0:
+        sys.exit(f"{script} failed with status {status}")
+    return seconds, usage.ru_maxrss / 1024     # ru_maxrss is in KiB on Linux
+
+def main():
+    parser = argparse.ArgumentParser(description='measure the time and memory sql2html.py needs for a large websites.db')
+    parser.add_argument('-n', '--rows', type=int, default=100000, help='number of websites in the generated database (default: 100000)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='number of runs, the fastest is reported (default: 3)')
+    parser.add_argument('--compare', type=str, help='another sql2html.py to run on the same database, e.g. an older version')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_sql2html_")
+    try:
+        create_database(os.path.join(directory, "websites.db"), args.rows)
+        scripts = [os.path.join(REPO, "sql2html.py")] + ([os.path.abspath(args.compare)] if args.compare else [])
+        outputs = []
+        for script in scripts:
+            results = [run(script, directory) for _ in range(args.repeat)]
+            seconds = min(result[0] for result in results)
+            peak = max(result[1] for result in results)
+            print(f"{script}: {args.rows} rows in {seconds:.2f} seconds, peak RSS {peak:.0f} MiB")
+            with open(os.path.join(directory, "index.html"), "rb") as f:
+                outputs.append(f.read())
+        if args.compare:
+            print("index.html identical" if outputs[0] == outputs[1] else "index.html differs")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
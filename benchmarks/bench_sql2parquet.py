@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+###########################################################################################################
+# benchmark for sql2parquet.py: exports a year of generated daily databases (365 x 2000 websites by default)
+# to a Parquet dataset, then reports how long appending one more day and loading the whole year take
+#   ./benchmarks/bench_sql2parquet.py
+#   ./benchmarks/bench_sql2parquet.py --days 365 --rows 20000
+# 20241018
+###########################################################################################################
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import time
+from bench_sql2html import REPO, create_database
+from sql2parquet import export, load
+
+def main():
+    parser = argparse.ArgumentParser(description='measure exporting to and loading from a Parquet dataset with a year of scans')
+    parser.add_argument('--days', type=int, default=365, help='number of daily databases (default: 365)')
+    parser.add_argument('--rows', type=int, default=2000, help='websites per daily database (default: 2000)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench_sql2parquet_")
+    try:
+        first = datetime.date(2024, 1, 1)
+        databases = []
+        for day in range(args.days + 1):
+            scan_date = (first + datetime.timedelta(days=day)).strftime("%Y%m%d")
+            os.makedirs(os.path.join(directory, scan_date))
+            databases.append(os.path.join(directory, scan_date, "websites.db"))
+            create_database(databases[-1], args.rows, seed=day)
+        dataset = os.path.join(directory, "results.parquet")
+        quiet = lambda msg: None
+
+        start = time.monotonic()
+        for db_path in databases[:-1]:
+            export(db_path, dataset, logger=quiet)
+        print(f"export of {args.days} days x {args.rows} websites: {time.monotonic() - start:.2f} seconds")
+
+        start = time.monotonic()
+        export(databases[-1], dataset, logger=quiet)
+        print(f"append of one day: {time.monotonic() - start:.3f} seconds")
+
+        start = time.monotonic()
+        table = load(dataset)
+        print(f"load of {table.num_rows} rows ({args.days + 1} days): {time.monotonic() - start:.3f} seconds, {table.nbytes / 2**20:.0f} MiB in memory")
+        size = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(dataset) for name in names)
+        print(f"dataset on disk: {size / 2**20:.1f} MiB")
+        print(table.schema)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
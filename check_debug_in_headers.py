@@ -4,8 +4,9 @@
 # 20240521
 ###########################################################################################################
 import requests
+import http_client
 
-def check_debug_in_headers(website, url, outfile, logger, myheaders):
+async def check_debug_in_headers_async(website, url, outfile, logger, myheaders):
     """
     Args:
     website (str): The website being checked.
@@ -19,7 +20,7 @@ def check_debug_in_headers(website, url, outfile, logger, myheaders):
     outfile.write('\n===========Check for the word "debug" in HTTP header info\n')
 
     try:
-        response = requests.get(url, headers = myheaders, timeout=5)
+        response = await http_client.get(url, headers = myheaders, timeout=5)
         headers = response.headers
         for key, value in headers.items():
             if 'debug' in key.lower() or 'debug' in value.lower():
@@ -35,3 +36,9 @@ def check_debug_in_headers(website, url, outfile, logger, myheaders):
     outfile.write("OK\ndebug not found in HTTP headers\n")
 
     return 1
+
+def check_debug_in_headers(website, url, outfile, logger, myheaders):
+    """
+    Blocking version of check_debug_in_headers_async, takes the same arguments.
+    """
+    return http_client.run(check_debug_in_headers_async(website, url, outfile, logger, myheaders))
@@ -1,79 +1,174 @@
 ###########################################################################################################
 # if the website name doesn't resolve we can skip the other checks
 # this check is only for logging purposes and is not visible in the dashboard overview
-# 20240521
+# resolve_websites resolves the whole input list up front with the async resolver (bounded concurrency and
+# a deadline per query), check_dns then only reports the records of that stage for each website
+# with a DNSCache the records are taken from and added to that cache, so the TTLs are respected
+# 20241018
 ###########################################################################################################
+import asyncio
+import time
+import dns.asyncresolver
+import dns.exception
 import dns.resolver
-def check_dns(website, outfile, logger):
+from dns_cache import NEGATIVE_TTL
+import tracing
+
+DNS_CONCURRENCY = 50    # websites being resolved at the same time
+DNS_DEADLINE = 5.0      # seconds for a single query (including retries to other nameservers)
+RECORD_TYPES = ["A", "AAAA", "CNAME", "MX", "TXT"]
+
+async def resolve_website(website, resolver=None, deadline=DNS_DEADLINE, cache=None):
+    """
+    Returns the DNS records of a website as a dict with the status ("ok", "NXDOMAIN", "SERVFAIL",
+    "timeout" or "error"), the error message and a list of values for each record type.
+    The A query goes first, the other record types are only queried if the name exists.
+
+    Args:
+    website (str): The website being checked.
+    resolver (dns.asyncresolver.Resolver): The resolver to use, defaults to the system resolver.
+    deadline (float): seconds for a single query
+    cache (DNSCache): The DNS cache to use (optional).
+    """
+    resolver = resolver or dns.asyncresolver.get_default_resolver()
+    records = {"status": "ok", "error": None}
+
+    async def query(rdtype):
+        values = cache.get(website, rdtype) if cache else None
+        if values is not None:
+            return values
+        try:
+            answer = await resolver.resolve(website, rdtype, lifetime=deadline)
+        except dns.resolver.NoAnswer:
+            if cache:
+                cache.put(website, rdtype, [], NEGATIVE_TTL)
+            return []
+        if rdtype in ["A", "AAAA"]:
+            values = [rr.address for rr in answer]
+        elif rdtype == "CNAME":
+            values = [rr.target.to_text() for rr in answer]
+        elif rdtype == "MX":
+            values = [rr.exchange.to_text() for rr in answer]
+        else:
+            values = [txt_string.decode('utf-8', errors='replace') for rr in answer for txt_string in rr.strings]
+        if cache:
+            cache.put(website, rdtype, values, answer.rrset.ttl)
+        return values
+
+    try:
+        records["A"] = await query("A")
+        others = await asyncio.gather(*(query(rdtype) for rdtype in RECORD_TYPES[1:]), return_exceptions=True)
+        for rdtype, values in zip(RECORD_TYPES[1:], others):
+            # a failing query for one of the other types doesn't make the website unreachable
+            records[rdtype] = [] if isinstance(values, Exception) else values
+    except dns.resolver.NXDOMAIN:
+        records["status"] = "NXDOMAIN"
+    except dns.resolver.NoNameservers as e:
+        records["status"], records["error"] = "SERVFAIL", str(e)
+    except dns.resolver.LifetimeTimeout as e:
+        records["status"], records["error"] = "timeout", str(e)
+    except dns.exception.DNSException as e:
+        records["status"], records["error"] = "error", str(e)
+    return records
+
+async def resolve_websites(websites, logger, concurrency=DNS_CONCURRENCY, deadline=DNS_DEADLINE, cache=None):
+    """
+    Resolves all websites concurrently, at most `concurrency` at the same time.
+
+    Args:
+    websites (list): The websites to be resolved.
+    logger (function pointer): Function to print debug information.
+    concurrency (int): number of websites being resolved at the same time
+    deadline (float): seconds for a single query
+    cache (DNSCache): The DNS cache to use (optional).
+
+    Returns:
+    dict: website -> records as returned by resolve_website
+    """
+    resolver = dns.asyncresolver.Resolver()
+    limit = asyncio.Semaphore(concurrency)
+    start = time.monotonic()
+
+    async def resolve(website):
+        async with limit:
+            started = time.monotonic()
+            with tracing.site(website), tracing.span("dns", "check"):
+                records = await resolve_website(website, resolver, deadline, cache)
+            records["seconds"] = time.monotonic() - started     # for the check timings
+            return records
+
+    results = await asyncio.gather(*(resolve(website) for website in websites))
+    records = dict(zip(websites, results))
+    dead = [website for website, result in records.items() if result["status"] != "ok"]
+    logger(f"DNS stage: {len(records)} websites resolved in {time.monotonic() - start:.1f} seconds, {len(dead)} not resolvable: {dead}")
+    return records
+
+def check_dns(website, outfile, logger, records):
     """
     Args:
     website (str): The website being checked.
     outfile (file object): The file to write output to.
     logger (function pointer): Function to print debug information.
+    records (dict): The records from resolve_websites (or resolve_website).
     """
 
     logger(f"=== check_dns")
 
-    try:       
+    try:
         outfile.write("\n===========DNS Check\n")
 
-        try:
-            ipv4_answers = dns.resolver.resolve(website, 'A')  # check IPv4 addresses
-            for answer in ipv4_answers:
-                logger(answer.address)
-                outfile.write(f"{answer.address} \n")
-
-            try:
-                ipv6_answers = dns.resolver.resolve(website, 'AAAA')  # check IPv6 addresses
-                for answer in ipv6_answers:
-                    logger(answer.address)
-                    outfile.write(answer.address + "\n")
-            except dns.resolver.NoAnswer:
-                logger("no IPv6 addresses")
-                outfile.write("no IPv6 addresses\n")
-
-            try:
-                cname_answers = dns.resolver.resolve(website, 'CNAME')  # check CNAMEs (aliases)
-                for answer in cname_answers:
-                    logger(f"cname: {answer.target.to_text()}")
-                    outfile.write("cname: " + answer.target.to_text() + "\n")
-            except dns.resolver.NoAnswer:
-                logger("no CNAMEs")
-                outfile.write("no CNAMEs\n")
-
-            try:
-                mx_answers = dns.resolver.resolve(website, 'MX')  # check MX (mail exchange) records
-                for answer in mx_answers:
-                    logger(f"mx: {answer.exchange.to_text()}")
-                    outfile.write("mx: " + answer.exchange.to_text() + "\n")
-            except dns.resolver.NoAnswer:
-                logger("no MX records")
-                outfile.write("no MX records\n")
-
-            try:
-                txt_answers = dns.resolver.resolve(website, 'TXT')  # check for TXT (text) records
-                for answer in txt_answers:
-                    for txt_string in answer.strings:
-                        logger(f"TXT: {txt_string}")
-                        outfile.write("TXT: " + txt_string.decode('utf-8') + "\n")
-            except dns.resolver.NoAnswer:
-                logger("no TXT records")
-                outfile.write("no TXT records\n")
-
-        except dns.resolver.NoNameservers as e:
+        if records["status"] == "SERVFAIL":
             logger(f"DNS lookup for {website} failed with SERVFAIL")
             outfile.write(f"DNS lookup for {website} failed with SERVFAIL")
             return False
-        except dns.resolver.NXDOMAIN:
+        if records["status"] == "NXDOMAIN":
             logger(f"NXDOMAIN; Website {website} not found")
             outfile.write(f"NXDOMAIN; Website {website} not found")
             return False
-        except dns.resolver.LifetimeTimeout as e:
+        if records["status"] == "timeout":
             print(f"DNS resolution for {website} failed due to lifetime timeout.")
-            print(f"Error details: {e}")
+            print(f"Error details: {records['error']}")
             return False
+        if records["status"] == "error":
+            print(f"check_dns; an error occurred: {records['error']}")
+            return True
+
+        if not records["A"]:
+            logger("no IPv4 addresses")
+            outfile.write("no IPv4 addresses\n")
+        for address in records["A"]:
+            logger(address)
+            outfile.write(f"{address} \n")
+
+        if not records["AAAA"]:
+            logger("no IPv6 addresses")
+            outfile.write("no IPv6 addresses\n")
+        for address in records["AAAA"]:
+            logger(address)
+            outfile.write(address + "\n")
+
+        if not records["CNAME"]:
+            logger("no CNAMEs")
+            outfile.write("no CNAMEs\n")
+        for target in records["CNAME"]:
+            logger(f"cname: {target}")
+            outfile.write("cname: " + target + "\n")
+
+        if not records["MX"]:
+            logger("no MX records")
+            outfile.write("no MX records\n")
+        for exchange in records["MX"]:
+            logger(f"mx: {exchange}")
+            outfile.write("mx: " + exchange + "\n")
+
+        if not records["TXT"]:
+            logger("no TXT records")
+            outfile.write("no TXT records\n")
+        for txt_string in records["TXT"]:
+            logger(f"TXT: {txt_string}")
+            outfile.write("TXT: " + txt_string + "\n")
 
     except Exception as e:
         print(f"check_dns; an error occurred: {e}")
 
-    return True
\ No newline at end of file
+    return True
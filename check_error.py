@@ -1,13 +1,15 @@
 ###########################################################################################################
 # the error check tries to verify that there is no product information or version numbers in the HTTP error page
 # production websites should serve a clean error page and test websites should nog be open from the Internet
+# the error page comes from the not found baseline, which check_remnants uses as well
 # 20240521
 ###########################################################################################################
-import requests
+import http_client
+from not_found_baseline import get_not_found_baseline
 from bs4 import BeautifulSoup
 import re
 
-def check_error(website, url, outfile, logger, myheaders):
+async def check_error_async(website, url, outfile, logger, myheaders):
     """
     Args:
     website (str): The website being checked.
@@ -18,33 +20,36 @@ def check_error(website, url, outfile, logger, myheaders):
     """
     
     logger(f"=== error_check")
-    try:
-        my_url = url + "/sdfsffe978hjcf65"  # Random URL which will generate a 404 on the web server
-        response = requests.get(my_url, headers=myheaders, timeout=3)
-        html = response.text
-        soup = BeautifulSoup(html, "html.parser")
+    baseline = await get_not_found_baseline(url, myheaders, logger)     # random URL which will generate a 404 on the web server
+    if baseline is None:
+        return (0, "")  # Returning 0 in case of request failures
 
-        # Check for databases, words, and version numbers
-        databases = re.findall(r'(Oracle|MySQL|SQL Server|PostgreSQL)', soup.get_text())
-        words = re.findall(r'\b(Apache|nginx|Php)\b', soup.get_text())
-        numbers = re.findall(r"\b\d+\.\b", soup.get_text())
+    html = baseline.text
+    soup = BeautifulSoup(html, "html.parser")
 
-        check_error = 0
-        if databases:
-            logger(f"err found db: {databases}")
-        elif words:
-            logger(f"err found words: {words}")
-        elif numbers:
-            logger(f"err found numbers: {numbers}")
-        else:
-            check_error = 1
+    # Check for databases, words, and version numbers
+    databases = re.findall(r'(Oracle|MySQL|SQL Server|PostgreSQL)', soup.get_text())
+    words = re.findall(r'\b(Apache|nginx|Php)\b', soup.get_text())
+    numbers = re.findall(r"\b\d+\.\b", soup.get_text())
 
-        outfile.write("\n===========Error Check\n")
-        outfile.write(f"{'OK' if check_error == 1 else 'NOK'}")
-        # outfile.write(str(soup))
+    check_error = 0
+    if databases:
+        logger(f"err found db: {databases}")
+    elif words:
+        logger(f"err found words: {words}")
+    elif numbers:
+        logger(f"err found numbers: {numbers}")
+    else:
+        check_error = 1
 
-        return (check_error, str(soup))  # Return both check_error and the HTML soup
+    outfile.write("\n===========Error Check\n")
+    outfile.write(f"{'OK' if check_error == 1 else 'NOK'}")
+    # outfile.write(str(soup))
 
-    except requests.RequestException as e:
-        logger(f"Failed to fetch {url}: {str(e)}")
-        return (0, "")  # Returning 0 in case of request failures
+    return (check_error, str(soup))  # Return both check_error and the HTML soup
+
+def check_error(website, url, outfile, logger, myheaders):
+    """
+    Blocking version of check_error_async, takes the same arguments.
+    """
+    return http_client.run(check_error_async(website, url, outfile, logger, myheaders))
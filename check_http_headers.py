@@ -3,9 +3,10 @@
 # 20240521
 ###########################################################################################################
 import requests
+import http_client
 from pprint import pformat
 
-def check_http_headers(website, url, outfile, logger, myheaders):
+async def check_http_headers_async(website, url, outfile, logger, myheaders):
     """
     Args:
     website (str): The website being checked.
@@ -27,7 +28,7 @@ def check_http_headers(website, url, outfile, logger, myheaders):
     }
 
     try:
-        response = requests.get(url, headers = myheaders, allow_redirects=True, timeout=5)
+        response = await http_client.get(url, headers = myheaders, allow_redirects=True, timeout=5)
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to {website}: {e}")
         outfile.write(f"Error connecting to {website}: {e}\n")
@@ -85,3 +86,9 @@ def check_http_headers(website, url, outfile, logger, myheaders):
     outfile.write(f'{headers_formatted}\n')
 
     return check_header, hsts_duration_days
+
+def check_http_headers(website, url, outfile, logger, myheaders):
+    """
+    Blocking version of check_http_headers_async, takes the same arguments.
+    """
+    return http_client.run(check_http_headers_async(website, url, outfile, logger, myheaders))
@@ -3,9 +3,10 @@
 # 20240521
 ###########################################################################################################
 import requests
+import http_client
 from pprint import pformat
 
-def check_http_redirected_to_https(website, outfile, logger, myheaders):
+async def check_http_redirected_to_https_async(website, outfile, logger, myheaders):
     """
     Args:
     website (str): The website being checked.
@@ -22,7 +23,7 @@ def check_http_redirected_to_https(website, outfile, logger, myheaders):
 
     try:
         http_url = f'http://{website}'
-        response = requests.get(http_url, allow_redirects=0, timeout=3, headers=myheaders)
+        response = await http_client.get(http_url, allow_redirects=0, timeout=3, headers=myheaders)
         response.raise_for_status()
         headers_formatted = pformat(dict(response.headers))
         response_code = response.status_code
@@ -49,7 +50,7 @@ def check_http_redirected_to_https(website, outfile, logger, myheaders):
         check_redirect = 1  # From a security perspective, this is also OK because no unencrypted connection
     else:
         try:
-            response = requests.get(http_url, allow_redirects=1, timeout=3, headers=myheaders)
+            response = await http_client.get(http_url, allow_redirects=1, timeout=3, headers=myheaders)
 
             if response.history:
                 final_url = response.url
@@ -65,4 +66,10 @@ def check_http_redirected_to_https(website, outfile, logger, myheaders):
             outfile.write(f"HTTP request with allow redirects, Error: {err}\n")
             return 0
 
-    return 1
\ No newline at end of file
+    return 1
+
+def check_http_redirected_to_https(website, outfile, logger, myheaders):
+    """
+    Blocking version of check_http_redirected_to_https_async, takes the same arguments.
+    """
+    return http_client.run(check_http_redirected_to_https_async(website, outfile, logger, myheaders))
@@ -3,8 +3,9 @@
 # 20240521
 ###########################################################################################################
 import requests
+import http_client
 
-def check_https_reachable(website, url, outfile, logger, myheaders):
+async def check_https_reachable_async(website, url, outfile, logger, myheaders):
     """
     Args:
     website (str): The website being checked.
@@ -17,7 +18,7 @@ def check_https_reachable(website, url, outfile, logger, myheaders):
     logger(f"=== check_https_reachable")
     outfile.write(f'\n===========HTTPS reachable check\n')
     try:
-        response = requests.get(url, headers = myheaders, timeout=5)
+        response = await http_client.get(url, headers = myheaders, timeout=5)
         response.raise_for_status()  # If the response was successful, no Exception will be raised
         logger(f"Response Code: {response.status_code}")
         outfile.write(f"Response Code: {response.status_code}")
@@ -41,4 +42,10 @@ def check_https_reachable(website, url, outfile, logger, myheaders):
 
         return 0
 
-    return 1
\ No newline at end of file
+    return 1
+
+def check_https_reachable(website, url, outfile, logger, myheaders):
+    """
+    Blocking version of check_https_reachable_async, takes the same arguments.
+    """
+    return http_client.run(check_https_reachable_async(website, url, outfile, logger, myheaders))
@@ -1,12 +1,22 @@
 ###########################################################################################################
 # check if installation files from a CMS are still present on the webserver
 # filenames to check are read from remnants.txt
+# the files are probed in parallel (MAX_PARALLEL per host) with a GET that stops after the headers,
+# so remnants.txt can be a long wordlist
+# a file counts as present when it returns 200 and doesn't look like the not found page of the website,
+# so servers that return 200 on everything (catch-all) can be checked as well
 # 20240521
 ###########################################################################################################
 import os
+import asyncio
 import requests
+import http_client
+from not_found_baseline import get_not_found_baseline, BODY_PREFIX
 
-def check_remnants(website, url, outfile, logger, myheaders, rlff):
+MAX_PARALLEL = 8    # remnant probes in flight per host
+MAX_FAILURES = 5    # stop probing a host after this many failed requests (timeouts, connection errors)
+
+async def check_remnants_async(website, url, outfile, logger, myheaders, rlff):
     """
     Args:
     website (str): The website being checked.
@@ -20,28 +30,37 @@ def check_remnants(website, url, outfile, logger, myheaders, rlff):
     logger(f"=== check_remnants")
     outfile.write("\n===========Check for installation files left behind\n")
 
-    found_files = []
+    found = set()
     filenames = rlff('remnants.txt')
     if filenames is None:
         return 0
 
-    random_file = "iu87h8hkhkgigy"  # Replace this with your own random string
-    file_url = os.path.join(url, random_file)
-    response = requests.get(file_url, headers = myheaders, timeout=5)
-    if response.status_code == 200:
-        logger("This web server returns a HTTP code of 200 on everything, skipping checks")
-        outfile.write("This web server returns a HTTP code of 200 on everything, skipping checks")
-        return 1  # web server will pretend any file is present, so let's stop here
-
-    for file in filenames:
-        file_url = os.path.join(url, file)
-        try:
-            response = requests.get(file_url, headers = myheaders, timeout=5)
-            if response.status_code == 200:
-                found_files.append(file_url)
-        except requests.exceptions.RequestException as e:
-            logger(f"Error checking file '{file}': {e}")
-    
+    baseline = await get_not_found_baseline(url, myheaders, logger)
+    body_limit = 0
+    if baseline is not None and baseline.status == 200:
+        logger("This web server returns a HTTP code of 200 on everything, comparing with its not found page")
+        outfile.write("This web server returns a HTTP code of 200 on everything, comparing with its not found page\n")
+        body_limit = BODY_PREFIX    # the bodies are needed to tell the files from the not found page
+
+    limit = asyncio.Semaphore(MAX_PARALLEL)
+    failures = []
+
+    async def probe(file):
+        async with limit:
+            if len(failures) >= MAX_FAILURES:
+                return      # host is failing, don't bother with the rest
+            file_url = os.path.join(url, file)
+            try:
+                response = await http_client.probe(file_url, headers = myheaders, timeout=5, body_limit=body_limit)
+                if response.status_code == 200 and not (baseline and baseline.matches(response, file)):
+                    found.add(file)
+            except requests.exceptions.RequestException as e:
+                logger(f"Error checking file '{file}': {e}")
+                failures.append(file)
+
+    await asyncio.gather(*(probe(file) for file in filenames if file))
+    found_files = [os.path.join(url, file) for file in filenames if file in found]     # in the order of remnants.txt
+
     if found_files:
         logger(f"The following files gave a 200 response from {website}:")
         outfile.write(f"The following files gave a 200 response from {website}:")
@@ -50,7 +69,18 @@ def check_remnants(website, url, outfile, logger, myheaders, rlff):
             outfile.write(f"- {file}\n")
         return 0
 
+    elif len(failures) >= MAX_FAILURES:
+        logger(f"Stopped checking {url} for remnants after {len(failures)} failed requests")
+        outfile.write(f"Stopped checking {url} for remnants after {len(failures)} failed requests, result unknown\n")
+        return None
+
     else:
         logger(f"No files from remnants.txt were found in the web server root of {url}.")
         outfile.write(f"No files from remnants.txt were found in the web server root of {url}.")
-        return 1
\ No newline at end of file
+        return 1
+
+def check_remnants(website, url, outfile, logger, myheaders, rlff):
+    """
+    Blocking version of check_remnants_async, takes the same arguments.
+    """
+    return http_client.run(check_remnants_async(website, url, outfile, logger, myheaders, rlff))
@@ -1,12 +1,14 @@
 ###########################################################################################################
 # this check will verify that robots.txt only contains Allow statements, since Disallow statements give away 
 # interesting information to hackers (often first place to look in reconnaissance)
-# 20240521
+# with a file cache the request is conditional, if robots.txt didn't change the previous verdict is used
+# 20241018
 ###########################################################################################################
 import requests
+import http_client
 import re
 
-def check_robots(website, url, outfile, logger, myheaders):
+async def check_robots_async(website, url, outfile, logger, myheaders, file_cache=None):
     """
     Args:
     website (str): The website being checked.
@@ -14,14 +16,26 @@ def check_robots(website, url, outfile, logger, myheaders):
     outfile (file object): The file to write output to.
     logger (function pointer): Function to print debug information.
     myheaders (dict): The headers to send with the request.
+    file_cache (FileCache): Persistent cache for a conditional request (optional).
     """
     
     logger(f"=== robots_check")
     try:
         check = "NOK"
         myurl = url + "/robots.txt"
-        response = requests.get(myurl, headers=myheaders)
-        if response.status_code >= 200 and response.status_code < 300 and response.headers['Content-Type'].startswith("text/plain"):
+        previous = file_cache.lookup(myurl) if file_cache else None
+        if previous:
+            myheaders = file_cache.conditional_headers(myheaders, previous)
+        response = await http_client.get(myurl, headers=myheaders)
+
+        if file_cache and file_cache.not_modified(myurl, response, previous, logger):
+            outfile.write("\n===========Robots Check\n")
+            outfile.write(("OK" if previous["verdict"] == 1 else "NOK") + "\n")
+            outfile.write(f"not modified since {previous['fetched_at']}, verdict carried over\n")
+            outfile.write(previous["content"])
+            return previous["verdict"]
+
+        if response.status_code >= 200 and response.status_code < 300 and response.headers.get('Content-Type', '').startswith("text/plain"):
 
             disallow_regex = re.compile('^Disallow:', re.I)  # re.I = case insensitive
             allow_regex = re.compile('^Allow:', re.I)
@@ -50,6 +64,8 @@ def check_robots(website, url, outfile, logger, myheaders):
 
                 outfile.write("\n===========Robots Check\n")
                 outfile.write(check + "\n")
+                if file_cache:
+                    outfile.write("verdict computed from a fresh download\n")
                 outfile.write(response.text)
             else:
                 outfile.write("\n===========Robots Check\n")
@@ -57,6 +73,8 @@ def check_robots(website, url, outfile, logger, myheaders):
                 outfile.write("Error: Could not retrieve robots.txt file\n")
 
             check_robots = 1 if check == "OK" else 0
+            if file_cache:
+                file_cache.store(myurl, response, check_robots, logger)
 
             # The code is functional, but at the moment other checks have priority, so we'll leave
             # the good/bad results from the overview, but just store the info in the per website debug file
@@ -77,3 +95,9 @@ def check_robots(website, url, outfile, logger, myheaders):
     except requests.RequestException as e:
         logger(f"Failed to fetch {url}: {str(e)}")
         return 0  # Consider returning 0 in case of request failures
+
+def check_robots(website, url, outfile, logger, myheaders, file_cache=None):
+    """
+    Blocking version of check_robots_async, takes the same arguments.
+    """
+    return http_client.run(check_robots_async(website, url, outfile, logger, myheaders, file_cache))
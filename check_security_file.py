@@ -1,11 +1,13 @@
 ###########################################################################################################
 # CVD (Coordinated Vulnerability Disclosure) requires security contact information to be present on this URL
-# 20240521
+# with a file cache the request is conditional, if security.txt didn't change the previous verdict is used
+# 20241018
 ###########################################################################################################
 import requests
+import http_client
 from pprint import pformat
 
-def check_security_file(website, url, outfile, logger, myheaders):
+async def check_security_file_async(website, url, outfile, logger, myheaders, file_cache=None):
     """
     Args:
     website (str): The website being checked.
@@ -13,6 +15,7 @@ def check_security_file(website, url, outfile, logger, myheaders):
     outfile (file object): The file to write output to.
     logger (function pointer): Function to print debug information.
     myheaders (dict): The headers to send with the request.
+    file_cache (FileCache): Persistent cache for a conditional request (optional).
     """
     
     logger(f"=== check_security_file")
@@ -20,10 +23,24 @@ def check_security_file(website, url, outfile, logger, myheaders):
 
     security_file = 0
     try:
-        response = requests.get(f"{url}/.well-known/security.txt", headers=myheaders)
-        if response.status_code >= 200 and response.status_code < 300 and response.headers['Content-Type'].startswith("text/plain"):
+        myurl = f"{url}/.well-known/security.txt"
+        previous = file_cache.lookup(myurl) if file_cache else None
+        if previous:
+            myheaders = file_cache.conditional_headers(myheaders, previous)
+        response = await http_client.get(myurl, headers=myheaders)
+
+        if file_cache and file_cache.not_modified(myurl, response, previous, logger):
+            outfile.write(("OK" if previous["verdict"] == 1 else "NOK") + "\n")
+            outfile.write(f"not modified since {previous['fetched_at']}, verdict carried over\n")
+            outfile.write(previous["content"])
+            return previous["verdict"]
+
+        if response.status_code >= 200 and response.status_code < 300 and response.headers.get('Content-Type', '').startswith("text/plain"):
             security_file = 1
             outfile.write("OK\n")
+            if file_cache:
+                outfile.write("verdict computed from a fresh download\n")
+                file_cache.store(myurl, response, security_file, logger)
             outfile.write(response.text)
         else:
             outfile.write("NOK\n")
@@ -35,4 +52,10 @@ def check_security_file(website, url, outfile, logger, myheaders):
         print(f"An error occurred while checking the security file: {e}")
         outfile.write(f"An error occurred while checking the security file: {e}\n")
 
-    return security_file
\ No newline at end of file
+    return security_file
+
+def check_security_file(website, url, outfile, logger, myheaders, file_cache=None):
+    """
+    Blocking version of check_security_file_async, takes the same arguments.
+    """
+    return http_client.run(check_security_file_async(website, url, outfile, logger, myheaders, file_cache))
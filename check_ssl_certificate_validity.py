@@ -1,57 +1,99 @@
 ###########################################################################################################
-# SSL/TLS Certificate Check 
-# 20240707
+# SSL/TLS Certificate Check
+# one bounded TLS handshake per website, the leaf certificate and verified chain are captured once and the
+# certificate facts (fingerprint, expiry, DER) are handed to the caller to store in the database, so other
+# checks can use them without opening their own connection
+# 20241018
 ###########################################################################################################
 import ssl
 import socket
 import datetime
+import hashlib
+from check_timing import note_failure
+import tracing
 
-def check_ssl_certificate_validity(website, outfile, logger):
+CONNECT_TIMEOUT = 10    # seconds for the TCP connect and the TLS handshake
+
+def verified_chain(ssock):
+    # public as SSLSocket.get_verified_chain() since Python 3.13, on the internal SSL object before that
+    get_chain = getattr(ssock, "get_verified_chain", None) or getattr(ssock._sslobj, "get_verified_chain", None)
+    if get_chain is None:
+        return []
+    return [cert if isinstance(cert, bytes) else cert.public_bytes(ssl._ssl.ENCODING_DER) for cert in get_chain()]
+
+def check_ssl_certificate_validity(website, outfile, logger, facts=None):
     """
     Args:
     website (str): The website being checked.
     outfile (file object): The file to write output to.
     logger (function pointer): Function to print debug information.
+    facts (dict): If given, the certificate facts are stored in it under "certificate" (optional).
     """
 
     logger(f"=== check_ssl_certificate_validity")
     outfile.write("\n===========Certificate validity Check\n")
 
-    try:
-        # Establish a secure connection to the website and retrieve its SSL certificate information
-        cert = ssl.get_server_certificate((website, 443))
-
-        # Verify the certificate
-        context = ssl.create_default_context()
-        context.check_hostname = True
-        context.verify_mode = ssl.CERT_REQUIRED
+    # Verify the certificate
+    context = ssl.create_default_context()
+    context.check_hostname = True
+    context.verify_mode = ssl.CERT_REQUIRED
 
-        # Create a socket and wrap it with an SSL context
-        with socket.create_connection((website, 443)) as sock:
-            with context.wrap_socket(sock, server_hostname=website) as ssock:
+    try:
+        # Create a socket and wrap it with an SSL context, this is the only connection to the website
+        with tracing.span("connect", "phase", host=website, port=443):
+            sock = socket.create_connection((website, 443), timeout=CONNECT_TIMEOUT)
+        with sock:
+            with tracing.span("tls", "phase", host=website):
+                ssock = context.wrap_socket(sock, server_hostname=website)
+            with ssock:
                 # Get the certificate information
                 cert_info = ssock.getpeercert()
-
-        # Get the expiration date of the certificate
-        cert_expiration = datetime.datetime.strptime(cert_info['notAfter'], '%b %d %H:%M:%S %Y %Z')
-
-        # Get the issuer information of the certificate
-        cert_ca = cert_info['issuer']
-
-        current_time = datetime.datetime.now(datetime.timezone.utc)
-        days_left = (cert_expiration - current_time).days
-        outfile.write(f"certificate expiration: {cert_expiration}\n")
-        outfile.write(f"time of check (utc)   : {current_time}\n")
-        outfile.write(f"certificate days left : {days_left}\n")
-        outfile.write(f"certificate issuer    : {cert_ca}\n")
-
-        if days_left > 29:
-            outfile.write("OK\n")
-        else:
-            outfile.write("NOK\n")
-        return days_left
+                der = ssock.getpeercert(binary_form=True)
+                chain = verified_chain(ssock)
+                ipaddr = ssock.getpeername()[0]
 
     except ssl.SSLError as e:
+        note_failure(e)
         print(f"SSL Error: {e}")
+        logger(f"SSL Error: {e}")
+        outfile.write(f"NOK\nSSL Error: {e}\n")
         # If the certificate is invalid, return False
         return 0
+    except OSError as e:
+        note_failure(e)
+        logger(f"Connection to {website}:443 failed: {e}")
+        outfile.write(f"NOK\nConnection to {website}:443 failed: {e}\n")
+        return 0
+
+    # Get the expiration date of the certificate
+    cert_expiration = datetime.datetime.fromtimestamp(ssl.cert_time_to_seconds(cert_info['notAfter']), datetime.timezone.utc)
+
+    # Get the issuer information of the certificate
+    cert_ca = cert_info['issuer']
+    fingerprint = hashlib.sha256(der).hexdigest()
+
+    current_time = datetime.datetime.now(datetime.timezone.utc)
+    days_left = (cert_expiration - current_time).days
+    outfile.write(f"certificate expiration: {cert_expiration}\n")
+    outfile.write(f"time of check (utc)   : {current_time}\n")
+    outfile.write(f"certificate days left : {days_left}\n")
+    outfile.write(f"certificate issuer    : {cert_ca}\n")
+    outfile.write(f"certificate sha256    : {fingerprint}\n")
+    outfile.write(f"verified chain length : {len(chain)}\n")
+
+    if facts is not None:
+        facts["certificate"] = {
+            "ip": ipaddr,
+            "fingerprint": fingerprint,
+            "not_after": cert_expiration.isoformat(),
+            "issuer": ", ".join("=".join(item) for rdn in cert_ca for item in rdn),
+            "subject": ", ".join("=".join(item) for rdn in cert_info.get('subject', ()) for item in rdn),
+            "chain_length": len(chain),
+            "der": der,
+        }
+
+    if days_left > 29:
+        outfile.write("OK\n")
+    else:
+        outfile.write("NOK\n")
+    return days_left
@@ -1,112 +1,244 @@
 ###########################################################################################################
 # This checks that the websites have the right grade according to Qualys SSLscore
-# 20240521
+# The assessments are pipelined: new assessments are submitted as long as the API allows
+# (X-Current-Assessments < X-Max-Assessments), and the hosts in progress are polled on the intervals
+# the API documentation suggests. 429/503/529 responses pause all submissions and polls.
+# base_url can point to a local stand-in of the SSL Labs API for testing, with a replaced sleep and clock the
+# scheduler runs against it without waiting (see tests/test_check_sslscore.py).
+# 20241018
 ###########################################################################################################
 import os
+import sys
 import requests
 import re
 import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor
+from artifact_store import open_artifact
 
-def check_sslscore(websites, use_cache, directory_path, logger):
+SSLLABS_API = "https://api.ssllabs.com/api/v3"
+
+POLL_DNS = 5                # seconds between polls while the status is DNS
+POLL_IN_PROGRESS = 10       # seconds between polls while the status is IN_PROGRESS
+RATE_LIMIT_WAIT = 30        # pause after a 429 (too many requests / new assessments)
+OVERLOAD_WAIT = 15 * 60     # pause after a 503 (maintenance) or 529 (overloaded), as the API documentation asks
+MAX_RETRIES = 4             # rate limit responses per host before it goes to the retry list
+MAX_ASSESSMENT_TIME = 30 * 60   # give up on (and retry later) a host that is in progress longer than this
+
+def check_sslscore(websites, use_cache, directory_path, logger, base_url=SSLLABS_API, sleep=time.sleep, grade_cache=None,
+                   started=(), checkpoint=None, clock=time.monotonic):
     """
     Args:
     websites (list): The websites to be checked.
     use_cache (boolean): Wether to accept cached results or request a fresh test
     directory_path (str): where to store detail/debug output
     logger (function pointer): Function to print debug information.
+    base_url (str): The SSL Labs API to use.
+    sleep (function pointer): Function to wait a number of seconds.
+    grade_cache (GradeCache): Persistent grade cache to consult before starting an assessment (optional).
+    started (list): Websites with an assessment that was started by an interrupted run, these are polled
+                    for their result instead of starting a new assessment.
+    checkpoint (function pointer): Called with (website, step, columns) when an assessment is started
+                                   ("ssllabs_started", columns None) and when a grade is known ("ssllabs",
+                                   columns grade and grade_check), so an interrupted run can be resumed (optional).
+    clock (function pointer): Function that returns the time in seconds, replaced together with sleep to run
+                              the scheduler against a stand-in API without waiting.
+
+    Returns:
+    tuple: (results, retry) with results a list of (website, grade, check_score) and retry the websites
+    that didn't produce a grade.
     """
 
-    base_url = "https://api.ssllabs.com/api/v3"
-    info_url = f"{base_url}/info"
-    retry = []
     results = []
+    retry = []
+    pending = [website for website in websites if website not in started]     # not submitted yet
+    # website -> (time of next poll, time of submission), assessments started by an interrupted run are polled right away
+    in_progress = {website: (0, clock()) for website in websites if website in started}
+    retries = {}                # website -> number of rate limit responses
+    paused_until = 0
+
+    def report(first):
+        # checkpoint the grades that were added to results since index first
+        if checkpoint:
+            for website, grade, check_score in results[first:]:
+                checkpoint(website, "ssllabs", {"grade": grade, "grade_check": check_score})
+
+    # grades of endpoints that didn't change since the last assessment come from the grade cache
+    identities = {}
+    if grade_cache:
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            identities = dict(zip(websites, executor.map(grade_cache.identity, websites)))
+        for website in list(pending):
+            cached = grade_cache.lookup(website, "ssllabs", identities[website])
+            if cached:
+                grade, check_score = cached
+                pending.remove(website)
+                write_outfile(directory_path, website, f"===========Qualys SSLscan\n{'OK' if check_score == 1 else 'NOK'}\ngrade from cache: {grade}\n")
+                results.append((website, grade, check_score))
+        report(0)
+        if not (pending or in_progress):
+            return results, retry
+    cached_results = len(results)
+
+    session = requests.Session()
+
+    try:
+        response = session.get(f"{base_url}/info", timeout=30)
+        response.raise_for_status()
+        info = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger(f"SSLlabs API not available: {e}")
+        return results, list(websites)
+
+    max_assessments = int(info.get("maxAssessments", 1))
+    current_assessments = int(info.get("currentAssessments", 0))
+    cool_off = int(info.get("newAssessmentCoolOff", 1000)) / 1000
+    logger(f"SSLlabs API: max and current assessment values are: {max_assessments} {current_assessments}, cool off {cool_off}s")
+
+    def analyze(website, new):
+        # the first request for a host starts (or gets from cache) the assessment, the next ones only poll
+        analyze_url = f"{base_url}/analyze?host={website}&all=done&publish=off"
+        if new:
+            analyze_url += "&fromCache=on&maxAge=18" if use_cache else "&startNew=on"
+        return session.get(analyze_url, timeout=30)
+
+    while pending or in_progress:
+        now = clock()
+        if now < paused_until:
+            sleep(paused_until - now)
+            continue
+
+        # poll the assessments that are due, then start new ones while there is room
+        due = [website for website, (next_poll, _) in in_progress.items() if next_poll <= now]
+        queue = [(website, False) for website in due]
+        if current_assessments < max_assessments and pending:
+            queue.append((pending[0], True))
+
+        for website, new in queue:
+            if new:
+                pending.pop(0)
+            try:
+                response = analyze(website, new)
+            except requests.exceptions.RequestException as e:
+                logger(f"Request Error for {website}: {e}")
+                in_progress.pop(website, None)
+                retry.append(website)
+                continue
+
+            # the rate limit headers are on every response
+            max_assessments = int(response.headers.get('X-Max-Assessments', max_assessments))
+            current_assessments = int(response.headers.get('X-Current-Assessments', current_assessments))
+
+            if response.status_code in [429, 503, 529]:
+                wait_time = RATE_LIMIT_WAIT if response.status_code == 429 else OVERLOAD_WAIT
+                retries[website] = retries.get(website, 0) + 1
+                logger(f"Received {response.status_code} error for {website}, retry {retries[website]}/{MAX_RETRIES}. Pausing {wait_time} seconds")
+                paused_until = clock() + wait_time
+                if retries[website] >= MAX_RETRIES:
+                    logger(f"Max retries reached for {website}")
+                    in_progress.pop(website, None)
+                    retry.append(website)
+                elif new:
+                    pending.insert(0, website)
+                break
+
+            try:
+                response.raise_for_status()
+                analysis_result = response.json()
+            except (requests.exceptions.HTTPError, ValueError) as e:
+                logger(f"HTTP Error for {website}: {e}")
+                in_progress.pop(website, None)
+                retry.append(website)
+                continue
+
+            status = analysis_result.get("status")
+            if new and checkpoint:
+                checkpoint(website, "ssllabs_started", None)
+            if status in ["DNS", "IN_PROGRESS"]:
+                submitted = in_progress[website][1] if website in in_progress else clock()
+                if clock() - submitted > MAX_ASSESSMENT_TIME:
+                    logger(f"{website} still in progress after {MAX_ASSESSMENT_TIME} seconds, will retry")
+                    in_progress.pop(website)
+                    retry.append(website)
+                    continue
+                interval = POLL_DNS if status == "DNS" else POLL_IN_PROGRESS
+                in_progress[website] = (clock() + interval, submitted)
+                logger(f"{website}: {status}, next poll in {interval} seconds")
+            else:
+                in_progress.pop(website, None)
+                if status == "READY":
+                    first = len(results)
+                    report_grades(website, response, analysis_result, directory_path, logger, results, retry)
+                    report(first)
+                else:
+                    message = analysis_result.get("statusMessage", status)
+                    logger(f"SSLlabs assessment for {website} failed: {message}")
+                    write_outfile(directory_path, website, f"===========Qualys SSLscan\nassessment failed: {message}\n")
+
+            if new:
+                sleep(cool_off)     # the API wants a pause between new assessments
+
+        else:
+            if pending and current_assessments < max_assessments:
+                continue        # room for the next new assessment
+            if in_progress:
+                next_poll = min(next_poll for next_poll, _ in in_progress.values())
+                sleep(max(0, next_poll - clock()))
+            elif pending:
+                # all assessment slots are taken (e.g. by another scan with the same IP), check again later
+                sleep(POLL_IN_PROGRESS)
+                try:
+                    response = session.get(f"{base_url}/info", timeout=30)
+                    current_assessments = int(response.json().get("currentAssessments", current_assessments))
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    logger(f"SSLlabs API info failed: {e}")
 
-    # Define maximum retry attempts and the wait time for rate limit errors
-    max_retries = 4
-    wait_time = 30
-
-    for website in websites:
-        retry_count = 0
-        myfile = os.path.join(directory_path, f"{website}.html")
-        with open(myfile, "a") as outfile:
-            outfile.write("===========Qualys SSLscan\n")
+    session.close()
 
-            while retry_count < max_retries:
-                try:
-                    logger(f"\ncheck_sslscore for: {website}")
-                    # Get rate limits
-                    rate_limit_response = requests.head(info_url)
-                    rate_limit_response.raise_for_status()
-                    max_assessments = int(rate_limit_response.headers.get('X-Max-Assessments', 0))
-                    current_assessments = int(rate_limit_response.headers.get('X-Current-Assessments', 0))
-                    logger(f"SSLlabs API: max and current assessment values are: {max_assessments} {current_assessments}")
-
-                    if current_assessments < max_assessments:
-                        time.sleep(5)
-                        check_score = 0
-                        # analyze_url = f"{base_url}/analyze?host={website}&all=done&publish=off&fromCache={'on' if use_cache else 'off'}"
-                        if use_cache:
-                            analyze_url = f"{base_url}/analyze?host={website}&all=done&publish=off&fromCache=on&maxAge=18"
-                        else:
-                            analyze_url = f"{base_url}/analyze?host={website}&all=done&publish=off&fromCache=off"
-                        response = requests.get(analyze_url)
-                        response.raise_for_status()
-
-                        analysis_result = response.json()
-                        endpoints = analysis_result.get("endpoints", [])
-                        if endpoints:
-                            for endpoint in endpoints:
-                                grade = endpoint.get("grade", "N/A")
-                                if grade != "N/A":
-                                    ipaddr = endpoint.get("ipAddress", "N/A")
-                                    logger(f"Website: {website}, endpoint: {ipaddr} Grade: {grade}")
-                                    regexp = re.compile(r'A')
-                                    check_score = 1 if regexp.search(grade) else 0
-                                    outfile.write(f"{'OK' if check_score == 1 else 'NOK'}\nSSLscan grade for {ipaddr}: {grade}")
-
-                                    sslscanfile = os.path.join(directory_path, f"{website}-sslscan.json")
-                                    with open(sslscanfile, "w") as sfile:
-                                        try:
-                                            sfile.write(f"{response.text}")
-                                            outfile.write(f"\n<a href=\"{website}-sslscan.json\">{website}-sslscan.json</a>\n")
-                                        except OSError as e:
-                                            sys.exit(f"Error trying to open for writing {sslscanfile}: {e}")
-                                    sfile.close()
-
-                                    done_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
-                                    outfile.write(f"{website} checks done at: {done_date} \n")
-                                    results.append((website, grade, check_score))
-
-                                else:
-                                    logger(f"{website} did not return a grade, will retry")
-                                    if website not in retry:
-                                        retry.append(website)
-
-                        else:
-                            logger(f"No endpoints found for {website} yet")
-                            if website not in retry:
-                                retry.append(website)
-
-                        break
-
-                    logger(f"Rate limit reached, waiting {wait_time} seconds before retrying")
-                    time.sleep(wait_time)
-
-                except requests.exceptions.HTTPError as e:
-                    if e.response.status_code in [429, 529]:
-                        retry_count += 1
-                        logger(f"Received {e.response.status_code} error, retry {retry_count}/{max_retries}. Waiting {wait_time} seconds before retrying")
-                        time.sleep(wait_time)
-                    else:
-                        logger(f"HTTP Error: {e}")
-                        break
-                except requests.exceptions.RequestException as e:
-                    logger(f"Request Error: {e}")
-                    break
-
-            if retry_count == max_retries:
-                logger(f"Max retries reached for {website}")
-                retry.append(website)
+    if grade_cache:
+        for website, grade, check_score in results[cached_results:]:
+            grade_cache.store(website, "ssllabs", identities[website], grade, check_score)
 
     return results, retry
+
+###########################################################################################################
+# write the grades of a finished assessment to the detailed log of the website
+###########################################################################################################
+def report_grades(website, response, analysis_result, directory_path, logger, results, retry):
+    endpoints = analysis_result.get("endpoints", [])
+    if not endpoints:
+        logger(f"No endpoints found for {website} yet")
+        retry.append(website)
+        return
+
+    with open_artifact(directory_path, f"{website}.html", "a") as outfile:
+        outfile.write("===========Qualys SSLscan\n")
+        for endpoint in endpoints:
+            grade = endpoint.get("grade", "N/A")
+            if grade != "N/A":
+                ipaddr = endpoint.get("ipAddress", "N/A")
+                logger(f"Website: {website}, endpoint: {ipaddr} Grade: {grade}")
+                regexp = re.compile(r'A')
+                check_score = 1 if regexp.search(grade) else 0
+                outfile.write(f"{'OK' if check_score == 1 else 'NOK'}\nSSLscan grade for {ipaddr}: {grade}")
+
+                sslscanfile = os.path.join(directory_path, f"{website}-sslscan.json")
+                with open_artifact(directory_path, f"{website}-sslscan.json", "w") as sfile:
+                    try:
+                        sfile.write(f"{response.text}")
+                        outfile.write(f"\n<a href=\"{website}-sslscan.json\">{website}-sslscan.json</a>\n")
+                    except OSError as e:
+                        sys.exit(f"Error trying to open for writing {sslscanfile}: {e}")
+
+                done_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+                outfile.write(f"{website} checks done at: {done_date} \n")
+                results.append((website, grade, check_score))
+
+            else:
+                logger(f"{website} did not return a grade, will retry")
+                if website not in retry:
+                    retry.append(website)
+
+def write_outfile(directory_path, website, text):
+    with open_artifact(directory_path, f"{website}.html", "a") as outfile:
+        outfile.write(text)
@@ -1,46 +1,164 @@
 ###########################################################################################################
 # This checks that the website has the right grade according to Qualys SSLtest by using testssl.sh
-# 20240521
+# check_testssl_batch runs a number of testssl.sh processes in parallel, each with a timeout. The text
+# report is streamed to {website}-testssl.txt and the grade and findings are read from the JSON file
+# testssl.sh writes ({website}-testssl.json), so no report is kept in memory.
+# 20241018
 ###########################################################################################################
 import os
+import json
 import subprocess
 import re
+import signal
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from artifact_store import open_artifact, pack_artifact
+from log_pipeline import set_site
 
-def check_testssl(website, outfile, logger):
+testssl_path = "/usr/local/bin/testssl.sh"  # Replace this with the path to testssl.sh v3.2
+TESTSSL_TIMEOUT = 20 * 60       # seconds before a testssl.sh run is killed
+SEVERITIES = ["CRITICAL", "HIGH", "MEDIUM", "LOW", "WARN"]
+
+def run_testssl(website, directory_path, logger, timeout=TESTSSL_TIMEOUT):
+    """
+    Runs testssl.sh for one website.
+
+    Args:
+    website (str): The website being checked.
+    directory_path (str): where to store the testssl.sh output
+    logger (function pointer): Function to print debug information.
+    timeout (float): seconds before testssl.sh is killed
+
+    Returns:
+    tuple: (grade, findings, runtime) with grade None if there is no grade, findings the number of
+    findings per severity and runtime the number of seconds testssl.sh ran.
+    """
+    textfile = os.path.join(directory_path, f"{website}-testssl.txt")
+    jsonfile = os.path.join(directory_path, f"{website}-testssl.json")
+    if os.path.exists(jsonfile):
+        os.remove(jsonfile)     # testssl.sh refuses to overwrite it
+
+    start = time.monotonic()
+    with open(textfile, "w") as output:
+        process = subprocess.Popen([testssl_path, "--color", "0", "--warnings", "batch", "--jsonfile", jsonfile, website],
+                                   stdout=output, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                   start_new_session=True)      # its own process group, with the openssl processes it starts
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass        # exited just now
+            process.wait()
+            logger(f"testssl.sh for {website} killed after {timeout} seconds")
+    runtime = round(time.monotonic() - start, 1)
+
+    grade = None
+    findings = dict.fromkeys(SEVERITIES, 0)
+    try:
+        with open(jsonfile, "r") as f:
+            for finding in json.load(f):
+                if finding.get("id") == "overall_grade":
+                    grade = finding.get("finding")
+                if finding.get("severity") in findings:
+                    findings[finding["severity"]] += 1
+    except (OSError, ValueError) as e:
+        # older testssl.sh versions, or a run that was killed: fall back on the text report
+        logger(f"no usable testssl.sh JSON output for {website}: {e}")
+        with open(textfile, "r", errors="replace") as f:
+            for line in f:
+                match = re.search(r"Overall\s+Grade\s+([A-F][+-]?|-)", line)
+                if match:
+                    grade = match.group(1)
+
+    pack_artifact(textfile)      # with --artifacts the reports go into artifacts.db
+    pack_artifact(jsonfile)
+    logger(f"testssl.sh {website}: grade {grade}, {runtime} seconds")
+    return grade, findings, runtime
+
+def check_testssl(website, outfile, logger, grade_cache=None, directory_path=".", timeout=TESTSSL_TIMEOUT):
     """
     Args:
     website (str): The website being checked.
     outfile (file object): The file to write output to.
     logger (function pointer): Function to print debug information.
+    grade_cache (GradeCache): Persistent grade cache to consult before running testssl.sh (optional).
+    directory_path (str): where to store the testssl.sh output
+    timeout (float): seconds before testssl.sh is killed
+
+    Returns:
+    tuple: (grade, check_score, runtime), runtime is None if the grade came from the cache
     """
 
     logger(f"=== testssl.sh")
     outfile.write("\n===========SSL/TLS Configuration with testssl.sh CHECK\n")
 
-    testssl_path = "/usr/local/bin/testssl.sh"  # Replace this with the path to testssl.sh v3.2
     if not os.path.exists(testssl_path):
         print(f"Skipping testssl.sh check because the path is invalid: {testssl_path}")
-        return "Z",0
+        return "Z", 0, None
+
+    identity = None
+    if grade_cache:
+        identity = grade_cache.identity(website)
+        cached = grade_cache.lookup(website, "testssl", identity, logger)
+        if cached:
+            outfile.write(f"{'OK' if cached[1] == 1 else 'NOK'}\ngrade from cache: {cached[0]}\n")
+            return cached[0], cached[1], None
 
     try:
-        output = subprocess.check_output([testssl_path, "--color", "0", website])
-        output = output.decode('utf-8')
+        grade, findings, runtime = run_testssl(website, directory_path, logger, timeout)
+    except OSError as e:
+        print(f"Error running testssl.sh: {e}")
+        return "Z", 0, None
 
-        outfile.write(f"{output}\n")
+    outfile.write(f"testssl.sh ran for {runtime} seconds, findings: {', '.join(f'{k} {v}' for k, v in findings.items())}\n")
+    outfile.write(f"<a href=\"{website}-testssl.txt\">{website}-testssl.txt</a> <a href=\"{website}-testssl.json\">{website}-testssl.json</a>\n")
 
-        grade = None
-        match = re.search(r"Overall\s+Grade\s+([A-F][+-]?|-)", output)
+    if grade is None:
+        outfile.write("NOK\nno grade from testssl.sh\n")
+        return "Z", 0, runtime
 
-        if match:
-            grade = match.group(1)
-            logger(f"grade: {grade}")
+    regexp = re.compile(r'A')  # Anything from an A- and better is good for us
+    check_score = 1 if regexp.search(grade) else 0
+    outfile.write(f"{'OK' if check_score == 1 else 'NOK'}\ngrade: {grade}\n")
+    if grade_cache:
+        grade_cache.store(website, "testssl", identity, grade, check_score)
 
-    except subprocess.CalledProcessError as e:
-        print(f"Error running testssl.sh: {e}")
-        return "Z",0
+    return grade, check_score, runtime
 
-    if grade is not None:
-        regexp = re.compile(r'A')  # Anything from an A- and better is good for us
-        check_score = 1 if regexp.search(grade) else 0
+def check_testssl_batch(websites, directory_path, logger, workers=4, timeout=TESTSSL_TIMEOUT, grade_cache=None, on_result=None):
+    """
+    Runs check_testssl for a list of websites, with `workers` testssl.sh processes at the same time.
+    The results are appended to the detailed log of each website.
+
+    Args:
+    websites (list): The websites to be checked.
+    directory_path (str): where to store detail/debug output
+    logger (function pointer): Function to print debug information.
+    workers (int): number of testssl.sh processes running at the same time
+    timeout (float): seconds before a testssl.sh process is killed
+    grade_cache (GradeCache): Persistent grade cache (optional).
+    on_result (function pointer): Called with (website, grade, check_score, runtime) as soon as a website is done,
+                                  in the thread that called check_testssl_batch (optional).
+
+    Returns:
+    list: (website, grade, check_score, runtime) in the order of websites
+    """
+    def job(website):
+        set_site(website)       # the debug.log lines of this run are tagged with the website
+        with open_artifact(directory_path, f"{website}.html", "a") as outfile:
+            grade, check_score, runtime = check_testssl(website, outfile, logger, grade_cache, directory_path, timeout)
+            done_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+            outfile.write(f"{website} checks done at: {done_date} \n")
+        return website, grade, check_score, runtime
 
-    return grade, check_score
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in as_completed([executor.submit(job, website) for website in websites]):
+            result = future.result()
+            results[result[0]] = result
+            if on_result:
+                on_result(*result)
+    return [results[website] for website in websites]
@@ -0,0 +1,123 @@
+###########################################################################################################
+# timing of the checks, per website and per check
+# scan_website runs every check inside timed(), which measures the duration and decides the outcome:
+# "timeout" or "error" when a request (or the TLS connection) of the check failed that way, or the check
+# raised an exception, and "ok" otherwise. The checks handle their own errors, so http_client and
+# check_ssl_certificate_validity report failed requests with note_failure().
+# testssl.sh runs are recorded by record_testssl(), a grade from the grade cache is "cached".
+# The timings are stored in the check_timings table, summary() reports p50/p95/max per check and the
+# slowest websites at the end of a run.
+# 20241018
+###########################################################################################################
+import contextlib
+import contextvars
+import datetime
+import math
+import socket
+import time
+import requests
+import tracing
+
+_failures = contextvars.ContextVar("check_timing_failures", default=None)     # failures of the running check
+
+def is_timeout(error):
+    return isinstance(error, (requests.exceptions.Timeout, socket.timeout, TimeoutError))
+
+def note_failure(error):
+    """
+    Records a failed request of the check that is running (if any), the check itself may handle the error.
+    """
+    failures = _failures.get()
+    if failures is not None:
+        failures.append(error)
+
+def outcome(failures):
+    if any(is_timeout(error) for error in failures):
+        return "timeout"
+    return "error" if failures else "ok"
+
+@contextlib.asynccontextmanager
+async def timed(check, store):
+    """
+    Times the check in the with block and stores the timing in the check_timings table.
+
+    Args:
+    check (str): The name of the check (the step name of the checkpoints).
+    store (function pointer): Function to store a dict of column values for this website in a table.
+    """
+    failures = []
+    token = _failures.set(failures)
+    started = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+    start = time.perf_counter()
+    try:
+        with tracing.span(check, "check"):
+            yield
+    except Exception as e:
+        failures.append(e)
+        raise
+    finally:
+        _failures.reset(token)
+        record(check, store, time.perf_counter() - start, outcome(failures), failures[-1] if failures else None, started)
+
+def record(check, store, seconds, result, error=None, started=None):
+    """
+    Stores the timing of a check that was measured elsewhere (e.g. the DNS stage or testssl.sh).
+    """
+    started = started or datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+    store({"check_name": check, "started": started, "seconds": round(seconds, 3), "outcome": result,
+           "error": str(error)[:200] if error else None}, "check_timings")
+
+def record_testssl(store, grade, runtime, timeout):
+    """
+    Stores the timing of a testssl.sh run (check_testssl_batch result). Without a runtime testssl.sh didn't
+    run: the grade came from the grade cache ("cached") or testssl.sh is missing or failed to start ("error").
+    """
+    if runtime is None:
+        record("testssl", store, 0, "error" if grade == "Z" else "cached")
+        return
+    record("testssl", store, runtime, "timeout" if runtime >= timeout else "error" if grade == "Z" else "ok")
+
+def dns_outcome(records):
+    """
+    Outcome of a resolve_website result, NXDOMAIN is an answer and not a failure.
+    """
+    if records["status"] == "timeout":
+        return "timeout"
+    return "error" if records["status"] in ["SERVFAIL", "error"] else "ok"
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+def summary(conn, logger, slowest=10):
+    """
+    Logs p50/p95/max and the outcomes per check, and the websites that took longest in total.
+
+    Args:
+    conn (sqlite3.Connection): The scan database.
+    logger (function pointer): Function to print debug information.
+    slowest (int): Number of slowest websites to show.
+    """
+    checks = {}
+    # grades from the grade cache took no time, they would only pull the percentiles down
+    for check, seconds, result in conn.execute("SELECT check_name, seconds, outcome FROM check_timings WHERE outcome != 'cached' ORDER BY check_name, seconds"):
+        entry = checks.setdefault(check, {"seconds": [], "ok": 0, "timeout": 0, "error": 0})
+        entry["seconds"].append(seconds)
+        entry[result] = entry.get(result, 0) + 1
+    if not checks:
+        return
+
+    logger("\n===========check timings (seconds)")
+    logger(f"{'check':<14} {'count':>6} {'p50':>8} {'p95':>8} {'max':>8} {'ok':>6} {'timeout':>8} {'error':>6}")
+    for check, entry in sorted(checks.items(), key=lambda item: -item[1]["seconds"][-1]):
+        seconds = entry["seconds"]
+        logger(f"{check:<14} {len(seconds):>6} {percentile(seconds, 0.5):>8.2f} {percentile(seconds, 0.95):>8.2f} {seconds[-1]:>8.2f} "
+               f"{entry['ok']:>6} {entry['timeout']:>8} {entry['error']:>6}")
+
+    logger(f"slowest websites:")
+    for website, total, check, longest in conn.execute('''
+            SELECT websites, SUM(seconds), check_name, MAX(seconds) FROM check_timings
+            GROUP BY websites ORDER BY SUM(seconds) DESC LIMIT ?''', (slowest,)):
+        logger(f"{website}: {total:.2f} seconds, longest check {check} ({longest:.2f} seconds)")
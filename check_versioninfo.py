@@ -4,9 +4,10 @@
 # 20240612
 ###########################################################################################################
 import requests
+import http_client
 import re
 
-def check_versioninfo(website, url, outfile, logger, myheaders):
+async def check_versioninfo_async(website, url, outfile, logger, myheaders):
     """
     Args:
     website (str): The website being checked.
@@ -23,7 +24,7 @@ def check_versioninfo(website, url, outfile, logger, myheaders):
     check_version = 1
 
     try:
-        response = requests.head(url, headers=myheaders, allow_redirects=True, timeout=5)           
+        response = await http_client.head(url, headers=myheaders, allow_redirects=True, timeout=5)           
     except requests.RequestException as e:
         logger(f"Failed to fetch {url}: {str(e)}")
         return 0  # returning NotOK in case of request failures
@@ -44,3 +45,9 @@ def check_versioninfo(website, url, outfile, logger, myheaders):
 
     outfile.write(f'{result}\n')
     return check_version
+
+def check_versioninfo(website, url, outfile, logger, myheaders):
+    """
+    Blocking version of check_versioninfo_async, takes the same arguments.
+    """
+    return http_client.run(check_versioninfo_async(website, url, outfile, logger, myheaders))
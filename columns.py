@@ -0,0 +1,74 @@
+###########################################################################################################
+# the columns of the website_checks table, in one place for the scanner and the exporters
+# scirtscan.py creates the table (and the meta structure) from this list, sql2html.py, sql2excel.py,
+# sql2csv.py and history.py select and render the columns from it. Adding a check means adding a column here.
+# for all INT verdicts, 1 = Good, meaning the check did find that the website was compliant with the security check,
+# or there was no information found that the website was incompliant with the security check.
+# 0 = Bad, empty = ? (don't know)
+#
+# name:    column name in website_checks
+# type:    SQLite type
+# comment: what the column holds
+# html:    header in the overview of sql2html.py (None: not shown)
+# excel:   header in the sheet of sql2excel.py (None: not exported)
+# render:  how the exporters show the value:
+#          "website", "grade", "days" (certificate validity), "hsts", "security_txt", "check_date",
+#          "verdict" (1 OK / 0 not OK), "verdict_black" (same, 0 is black in the overview) or "value"
+# 20241018
+###########################################################################################################
+from collections import namedtuple
+
+Column = namedtuple("Column", ["name", "type", "comment", "html", "excel", "render"])
+
+COLUMNS = [
+    Column("websites", "TEXT", "the website, primary key", "website", "website", "website"),
+    Column("https_reachable", "INT", "whether the website is reachable through HTTPS (on port443)", "https", "https", "verdict"),
+    Column("grade", "TEXT", "what is the Qualys SSLtest score (e.g. A+)", "grade", "grade", "grade"),
+    Column("grade_check", "INT", "is Qualys SSLtest score compliant with our requirements (e.g. > A-)", "grade<br>check", "grade check", "verdict"),
+    Column("redirect_check", "INT", "are HTTP requests redirected to HTTPS ?", "HTTPS<br>redirect", "HTTPS redirect", "verdict"),
+    Column("cert_validity", "INT", "how many days before the certificate expires", "cert<br>validity", "certificate validity", "days"),
+    Column("hsts", "INT", "HTTP Strict Transport Security", "HSTS<br>(days)", "HSTS", "hsts"),
+    Column("security_txt", "INT", "is .well-known/security.txt present?", "security<br>.txt", "security.txt", "security_txt"),
+    Column("version_check", "INT", "no version information disclosed in HTTP headers", "version", "version", "verdict"),
+    Column("robots_check", "INT", "only Allow in robots.txt", None, "robots.txt", "verdict"),
+    Column("error_check", "INT", "no version information disclosed in HTTP error page (404)", "error", "error", "verdict"),
+    Column("remnants", "INT", "whether there are remnants of CMS installation files on the website", "remnants", "remnants", "verdict"),
+    Column("debug", "INT", "if the HTTP headers returned contain the word debug (because you might want to investigate)", "debug", "debug", "verdict"),
+    Column("headers_check", "INT", "required HTTP security headers present?", "headers", "headers", "verdict_black"),
+    Column("check_date", "TEXT", "when were the checks performed", "detailed log", "detailed log", "check_date"),
+    Column("testssl_runtime", "REAL", "how many seconds testssl.sh ran for this website", None, None, "value"),
+]
+
+RESULT_COLUMNS = COLUMNS[1:]        # everything but the primary key
+OK_NOT_OK = ["verdict", "verdict_black", "security_txt"]     # shown as OK / NotOK in the excel sheet
+VERDICT_COLUMNS = [column.name for column in COLUMNS if column.render in ["verdict", "verdict_black", "grade", "days", "hsts", "security_txt"]]
+
+def create_table_sql():
+    """
+    Returns the CREATE TABLE statement for website_checks.
+    """
+    lines = [f"{column.name} {column.type}{' PRIMARY KEY' if column.name == 'websites' else ''}," for column in COLUMNS]
+    lines[-1] = lines[-1].rstrip(",")
+    width = max(len(line) for line in lines) + 1
+    lines = [f"        {line:<{width}} -- {column.comment}" for line, column in zip(lines, COLUMNS)]
+    return "CREATE TABLE IF NOT EXISTS website_checks\n    (\n" + "\n".join(lines) + "\n    )"
+
+def structure():
+    """
+    Returns the table structure that is stored in the meta table, for tools that read it from the database.
+    """
+    return "(   " + ", ".join(f"{column.name} {column.type}" for column in COLUMNS) + " )"
+
+def select_sql(conn, columns=COLUMNS, table="website_checks"):
+    """
+    Returns a SELECT of the columns from website_checks, columns that an older database doesn't have are NULL.
+    """
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    names = [column.name if column.name in existing else f"NULL AS {column.name}" for column in columns]
+    return f"SELECT {', '.join(names)} FROM {table}"
+
+def index_map(columns=COLUMNS):
+    """
+    Returns column name -> position in a row of select_sql.
+    """
+    return {column.name: position for position, column in enumerate(columns)}
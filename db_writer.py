@@ -0,0 +1,155 @@
+###########################################################################################################
+# single writer for the scan database
+# all results go through a queue to one writer thread, which merges the column updates for a website into
+# one upsert and commits in batches (every BATCH_SIZE websites or COMMIT_INTERVAL seconds, whatever comes
+# first). The database runs in WAL mode, so readers (e.g. sql2html during a scan) don't block the writer.
+# Checkpoints (a step of a website that is done) are committed in the same transaction as the results
+# that were queued before them, so a resumed scan never skips a step whose results were lost.
+# Tables with more than one row per website (e.g. check_timings) get whole rows with insert().
+# A batch that fails to be written is logged and the first error is raised by flush() and close(), so the
+# caller finds out. If the writer thread itself stops, waiting flush() calls are released with that error.
+# 20241018
+###########################################################################################################
+import queue
+import sqlite3
+import threading
+import time
+
+BATCH_SIZE = 50         # websites with pending updates before a commit
+COMMIT_INTERVAL = 5.0   # seconds before pending updates are committed anyway
+
+class DBWriter:
+    """
+    Args:
+    path (str): The SQLite database file.
+    logger (function pointer): Function to print debug information.
+    batch_size (int): Number of websites with pending updates that triggers a commit.
+    interval (float): Maximum number of seconds an update stays pending.
+    """
+
+    def __init__(self, path, logger, batch_size=BATCH_SIZE, interval=COMMIT_INTERVAL):
+        self.path = path
+        self.logger = logger
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue = queue.Queue()
+        self.upserts = self.commits = 0
+        self.error = None       # the first exception of the writer thread, raised in the caller
+        self.thread = threading.Thread(target=self.run, name="db_writer", daemon=True)
+        self.thread.start()
+
+    def put(self, website, columns, table="website_checks"):
+        """
+        Queues column values for a website, the row is created if it doesn't exist yet.
+        """
+        self.queue.put(("put", table, website, dict(columns)))
+
+    def insert(self, table, columns):
+        """
+        Queues a row for a table with its own primary key, an existing row with the same key is replaced.
+        """
+        self.queue.put(("insert", table, None, dict(columns)))
+
+    def checkpoint(self, website, step):
+        """
+        Queues the completion of a step (e.g. a check) of a website.
+        """
+        self.queue.put(("checkpoint", step, website, None))
+
+    def flush(self):
+        """
+        Waits until everything queued so far is committed.
+        """
+        done = threading.Event()
+        self.queue.put(("flush", done))
+        # a writer thread that stopped doesn't set the event anymore
+        while not done.wait(1) and self.thread.is_alive():
+            pass
+        self.raise_error()
+
+    def close(self):
+        self.queue.put(("close", None))
+        self.thread.join()
+        self.logger(f"database: {self.upserts} upserts in {self.commits} commits")
+        self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        try:
+            self.write_loop()
+        except Exception as error:
+            self.error = self.error or error
+            self.logger(f"database writer stopped: {error}")
+            # release the flush() calls that are waiting, what is still queued can't be written anymore
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    return
+                if item[0] == "flush":
+                    item[1].set()
+
+    def write_loop(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")     # in WAL mode this is still safe against corruption
+        pending = {}        # (table, website) -> columns
+        checkpoints = []    # (website, step, done_at)
+        rows = []           # (table, columns)
+        last_commit = time.monotonic()
+
+        while True:
+            timeout = max(0, last_commit + self.interval - time.monotonic()) if pending or checkpoints or rows else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ("interval", None)
+
+            kind = item[0]
+            if kind == "put":
+                _, table, website, columns = item
+                pending.setdefault((table, website), {}).update(columns)
+            elif kind == "checkpoint":
+                _, step, website, _ = item
+                checkpoints.append((website, step, time.strftime("%Y-%m-%d_%H:%M:%S")))
+            elif kind == "insert":
+                _, table, _, columns = item
+                rows.append((table, columns))
+
+            if kind not in ["put", "checkpoint", "insert"] or len(pending) >= self.batch_size or time.monotonic() - last_commit >= self.interval:
+                if pending or checkpoints or rows:
+                    self.write(conn, pending, checkpoints, rows)
+                    pending = {}
+                    checkpoints = []
+                    rows = []
+                last_commit = time.monotonic()
+
+            if kind == "flush":
+                item[1].set()
+            elif kind == "close":
+                conn.close()
+                return
+
+    def write(self, conn, pending, checkpoints, rows=()):
+        try:
+            with conn:      # one transaction, committed at the end of the block
+                for (table, website), columns in pending.items():
+                    names = ["websites"] + list(columns)
+                    update_clause = ", ".join([f"{column} = excluded.{column}" for column in columns])
+                    query = f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+                    query += f" ON CONFLICT (websites) DO UPDATE SET {update_clause}" if columns else " ON CONFLICT (websites) DO NOTHING"
+                    conn.execute(query, [website] + list(columns.values()))
+                for table, columns in rows:
+                    conn.execute(f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                 list(columns.values()))
+                conn.executemany("INSERT OR REPLACE INTO checkpoints (websites, step, done_at) VALUES (?, ?, ?)", checkpoints)
+            self.upserts += len(pending)
+            self.commits += 1
+
+        except sqlite3.Error as error:
+            # the batch is rolled back, the writer goes on with the next one
+            self.logger(f"Failed to update data in table: {error}")
+            self.error = self.error or error
@@ -0,0 +1,152 @@
+###########################################################################################################
+# DNS cache that respects the TTL of the records, shared by the DNS stage (check_dns) and every connection
+# scirtscan makes: install() replaces socket.getaddrinfo, which is what requests, aiohttp, ssl and
+# socket.create_connection use to resolve a hostname. With a path the cache is kept in a SQLite file
+# between runs (outside the date directory), like the grade cache.
+# testssl.sh is a separate process and does its own DNS lookups.
+# 20241018
+###########################################################################################################
+import ipaddress
+import socket
+import sqlite3
+import threading
+import time
+import dns.exception
+import dns.resolver
+
+NEGATIVE_TTL = 300      # seconds to remember that a name has no records of a type
+LOOKUP_DEADLINE = 5.0   # seconds for a query done on behalf of getaddrinfo
+
+_system_getaddrinfo = socket.getaddrinfo
+
+class DNSCache:
+    """
+    Args:
+    path (str): The SQLite file to keep the cache between runs (optional).
+    logger (function pointer): Function to print debug information.
+    """
+
+    def __init__(self, path=None, logger=print):
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.entries = {}               # (name, rdtype) -> (values, expires), expires in seconds since the epoch
+        self.system_names = set()       # names DNS doesn't know (e.g. from /etc/hosts), left to the system resolver
+        self.hits = self.misses = self.expired = 0
+        self.resolver = dns.resolver.Resolver()
+        self.conn = None
+        if path:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS dns_cache
+            (
+                name TEXT,
+                rdtype TEXT,
+                dns_values TEXT,                -- newline separated
+                expires REAL,                   -- seconds since the epoch
+                PRIMARY KEY (name, rdtype)
+            )
+            ''')
+            now = time.time()
+            for name, rdtype, values, expires in self.conn.execute("SELECT name, rdtype, dns_values, expires FROM dns_cache WHERE expires > ?", (now,)):
+                self.entries[(name, rdtype)] = (values.split("\n") if values else [], expires)
+            logger(f"using DNS cache {path}, {len(self.entries)} records still valid")
+
+    def get(self, name, rdtype):
+        """
+        Returns the cached values of a record type for a name, or None if they are not (or no longer) cached.
+        """
+        key = (name.lower().rstrip("."), rdtype)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            values, expires = entry
+            if expires <= time.time():
+                del self.entries[key]
+                self.expired += 1
+                return None
+            self.hits += 1
+            return values
+
+    def put(self, name, rdtype, values, ttl):
+        with self.lock:
+            self.entries[(name.lower().rstrip("."), rdtype)] = (list(values), time.time() + ttl)
+
+    def addresses(self, name):
+        """
+        Returns the IPv4 and IPv6 addresses of a name (IPv4 first), from the cache or resolved and cached now.
+        Returns None if DNS doesn't know the name, a timeout (or another failure that may be gone with the
+        next query) raises the DNSException.
+        """
+        addresses = []
+        for rdtype in ["A", "AAAA"]:
+            values = self.get(name, rdtype)
+            if values is None:
+                try:
+                    answer = self.resolver.resolve(name, rdtype, lifetime=LOOKUP_DEADLINE)
+                    values = [rr.address for rr in answer]
+                    self.put(name, rdtype, values, answer.rrset.ttl)
+                except dns.resolver.NoAnswer:
+                    values = []
+                    self.put(name, rdtype, values, NEGATIVE_TTL)
+                except (dns.resolver.NXDOMAIN, dns.resolver.NoNameservers):
+                    return None
+            addresses += values
+        return addresses or None
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        """
+        Drop-in replacement for socket.getaddrinfo that answers hostnames from the cache.
+        IP addresses, and names DNS doesn't know, go to the system resolver.
+        """
+        if not isinstance(host, str) or host in self.system_names:
+            return _system_getaddrinfo(host, port, family, type, proto, flags)
+        try:
+            ipaddress.ip_address(host)
+            return _system_getaddrinfo(host, port, family, type, proto, flags)
+        except ValueError:
+            pass
+
+        try:
+            addresses = self.addresses(host)
+        except dns.exception.DNSException:
+            # e.g. a timeout, only this lookup goes to the system resolver
+            return _system_getaddrinfo(host, port, family, type, proto, flags)
+        if addresses is None:
+            with self.lock:
+                self.system_names.add(host)
+            return _system_getaddrinfo(host, port, family, type, proto, flags)
+
+        result = []
+        for address in addresses:
+            address_family = socket.AF_INET6 if ":" in address else socket.AF_INET
+            if family in (0, socket.AF_UNSPEC, address_family):
+                result += _system_getaddrinfo(address, port, address_family, type, proto, flags | socket.AI_NUMERICHOST)
+        if not result:
+            raise socket.gaierror(socket.EAI_NONAME, f"no addresses of the requested family for {host}")
+        return result
+
+    def install(self):
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        socket.getaddrinfo = _system_getaddrinfo
+
+    def statistics(self):
+        return f"DNS cache: {self.hits} hits, {self.misses} misses, {self.expired} expired"
+
+    def close(self):
+        """
+        Writes the records that are still valid to the cache file (if any) and restores socket.getaddrinfo.
+        """
+        self.uninstall()
+        if self.conn is None:
+            return
+        now = time.time()
+        with self.lock:
+            rows = [(name, rdtype, "\n".join(values), expires) for (name, rdtype), (values, expires) in self.entries.items() if expires > now]
+            self.conn.execute("DELETE FROM dns_cache WHERE expires <= ?", (now,))
+            self.conn.executemany("INSERT OR REPLACE INTO dns_cache VALUES (?, ?, ?, ?)", rows)
+            self.conn.commit()
+            self.conn.close()
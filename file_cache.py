@@ -0,0 +1,94 @@
+###########################################################################################################
+# persistent cache of small files (robots.txt, security.txt) between runs, stored outside the date directory
+# the validators (ETag, Last-Modified) of the last download are sent along as If-None-Match /
+# If-Modified-Since, when the website answers 304 Not Modified the stored content and verdict are used
+# 20241018
+###########################################################################################################
+import datetime
+import hashlib
+import sqlite3
+import threading
+
+class FileCache:
+    """
+    Args:
+    path (str): The SQLite file with the cache.
+    logger (function pointer): Function to print debug information.
+    """
+
+    def __init__(self, path, logger):
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.fresh = self.carried_over = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS file_cache
+        (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,              -- SHA-256 of the content
+            content TEXT,
+            verdict INT,                    -- result of the check for this content
+            fetched_at TEXT                 -- ISO timestamp (UTC) of the download
+        )
+        ''')
+        self.conn.commit()
+        logger(f"using file cache {path}")
+
+    def lookup(self, url):
+        """
+        Returns the stored entry of a URL as a dict, or None.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT etag, last_modified, content_hash, content, verdict, fetched_at FROM file_cache WHERE url = ?",
+                                    (url,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["etag", "last_modified", "content_hash", "content", "verdict", "fetched_at"], row))
+
+    def conditional_headers(self, headers, entry):
+        """
+        Returns the request headers with the validators of the stored entry added.
+        """
+        headers = dict(headers or {})
+        if entry and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def not_modified(self, url, response, entry, logger):
+        """
+        Returns True if the response is a 304 for the stored entry, the verdict is then carried over.
+        """
+        if entry is None or response.status_code != 304:
+            with self.lock:
+                self.fresh += 1
+            return False
+        with self.lock:
+            self.carried_over += 1
+        logger(f"{url} not modified since {entry['fetched_at']}, verdict carried over")
+        return True
+
+    def store(self, url, response, verdict, logger):
+        """
+        Stores the validators, content and verdict of a downloaded file.
+        """
+        content_hash = hashlib.sha256(response.content).hexdigest()
+        previous = self.lookup(url)
+        if previous and previous["content_hash"] == content_hash:
+            logger(f"{url} content unchanged since {previous['fetched_at']}")
+        fetched_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO file_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (url, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                               content_hash, response.text, verdict, fetched_at))
+            self.conn.commit()
+
+    def statistics(self):
+        return f"file cache: {self.fresh} downloaded, {self.carried_over} not modified"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,118 @@
+###########################################################################################################
+# persistent cache of TLS grades (Qualys SSL Labs and testssl.sh), stored outside the date directory
+# a grade is reused when the hostname, the resolved IP addresses and the leaf certificate are the same as
+# when it was graded, and the grade isn't older than the maximum age
+# 20241018
+###########################################################################################################
+import datetime
+import hashlib
+import socket
+import sqlite3
+import ssl
+import threading
+
+def endpoint_identity(website, fingerprint=None, timeout=10):
+    """
+    Returns (ips, fingerprint) of the TLS endpoint: the sorted resolved IP addresses (comma separated)
+    and the SHA-256 fingerprint of the leaf certificate, or None if the endpoint can't be reached.
+
+    Args:
+    website (str): The website being checked.
+    fingerprint (str): The fingerprint if it is already known, then no TLS connection is made.
+    timeout (float): Timeout in seconds for the TLS connection.
+    """
+    try:
+        ips = sorted({addr[4][0] for addr in socket.getaddrinfo(website, 443, proto=socket.IPPROTO_TCP)})
+        if fingerprint is None:
+            pem = ssl.get_server_certificate((website, 443), timeout=timeout)
+            fingerprint = hashlib.sha256(ssl.PEM_cert_to_DER_cert(pem)).hexdigest()
+    except (OSError, ssl.SSLError):
+        return None
+    return ",".join(ips), fingerprint
+
+
+class GradeCache:
+    """
+    Args:
+    path (str): The SQLite file with the cache.
+    max_age (float): Maximum age of a cached grade in days.
+    logger (function pointer): Function to print debug information.
+    """
+
+    def __init__(self, path, max_age, logger):
+        self.max_age = datetime.timedelta(days=max_age)
+        self.logger = logger
+        self.fingerprints = {}      # website -> certificate fingerprint from the certificates table of this run
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS grade_cache
+        (
+            website TEXT,
+            source TEXT,                    -- ssllabs or testssl
+            ips TEXT,                       -- sorted resolved IP addresses, comma separated
+            fingerprint TEXT,               -- SHA-256 of the leaf certificate
+            grade TEXT,
+            grade_check INT,
+            graded_at TEXT,                 -- ISO timestamp (UTC)
+            PRIMARY KEY (website, source)
+        )
+        ''')
+        self.conn.commit()
+        logger(f"using grade cache {path}, maximum age {max_age} days")
+
+    def identity(self, website):
+        """
+        endpoint_identity() of the website, using the certificate that check_ssl_certificate_validity
+        stored in this run when there is one.
+        """
+        return endpoint_identity(website, self.fingerprints.get(website))
+
+    def lookup(self, website, source, identity, logger=None):
+        """
+        Returns (grade, grade_check) if there is a usable cached grade, otherwise None.
+        The reason for a hit or miss is logged.
+
+        Args:
+        website (str): The website being checked.
+        source (str): ssllabs or testssl.
+        identity (tuple): (ips, fingerprint) from identity(), or None.
+        logger (function pointer): Function to print debug information, defaults to the one of the cache.
+        """
+        logger = logger or self.logger
+        with self.lock:
+            row = self.conn.execute("SELECT ips, fingerprint, grade, grade_check, graded_at FROM grade_cache WHERE website = ? AND source = ?",
+                                    (website, source)).fetchone()
+
+        if row is None:
+            reason = "no cached grade"
+        elif identity is None:
+            reason = "endpoint could not be identified"
+        else:
+            ips, fingerprint, grade, grade_check, graded_at = row
+            age = datetime.datetime.now(datetime.timezone.utc) - datetime.datetime.fromisoformat(graded_at)
+            if ips != identity[0]:
+                reason = f"resolved IPs changed from {ips} to {identity[0]}"
+            elif fingerprint != identity[1]:
+                reason = "certificate changed"
+            elif age > self.max_age:
+                reason = f"cached grade is {age.days} days old"
+            else:
+                logger(f"grade cache hit for {website} ({source}): {grade}, graded at {graded_at}")
+                return grade, grade_check
+
+        logger(f"grade cache miss for {website} ({source}): {reason}")
+        return None
+
+    def store(self, website, source, identity, grade, grade_check):
+        if identity is None:
+            return
+        graded_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO grade_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                              (website, source, identity[0], identity[1], grade, grade_check, graded_at))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
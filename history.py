@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+###########################################################################################################
+# long-lived results store, all scans in one SQLite file next to the date directories
+# every scan gets a row in the scans table and its website_checks rows are appended to the results table,
+# keyed by (scan_id, website). Rows are only ever inserted, so the history can't be changed by a later run.
+# scirtscan.py --history FILE adds each scan when it is done, existing daily databases can be imported with:
+#   ./history.py history.db 2024*/websites.db
+# and the history of a website is shown with:
+#   ./history.py history.db -w www.example.com
+# 20241018
+###########################################################################################################
+import argparse
+import os
+import sqlite3
+import sys
+from columns import RESULT_COLUMNS, VERDICT_COLUMNS      # all website_checks columns are kept, the verdicts get an index
+
+class HistoryStore:
+    """
+    Args:
+    path (str): The SQLite file with the history.
+    logger (function pointer): Function to print debug information.
+    """
+
+    def __init__(self, path, logger=print):
+        self.logger = logger
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS scans
+        (
+            scan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            scan_date TEXT,                 -- YYYYMMDD, the name of the date directory
+            started TEXT,                   -- when the scan started, if known
+            version TEXT,                   -- scirtscan version
+            source TEXT                     -- the daily database the results came from
+        )
+        ''')
+        columns = ", ".join(f"{column.name} {column.type}" for column in RESULT_COLUMNS)
+        self.conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS results
+        (
+            scan_id INTEGER REFERENCES scans (scan_id),
+            website TEXT,
+            {columns},
+            PRIMARY KEY (scan_id, website)
+        )
+        ''')
+        # columns added to columns.py after the history was created
+        existing_columns = [row[1] for row in self.conn.execute("PRAGMA table_info(results)")]
+        for column in RESULT_COLUMNS:
+            if column.name not in existing_columns:
+                self.conn.execute(f"ALTER TABLE results ADD COLUMN {column.name} {column.type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scans_scan_date ON scans (scan_date)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_website ON results (website, scan_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS results_check_date ON results (check_date)")
+        for column in VERDICT_COLUMNS:
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS results_{column} ON results ({column}, scan_id)")
+        self.conn.commit()
+
+    def has_scan(self, scan_date):
+        return self.conn.execute("SELECT 1 FROM scans WHERE scan_date = ?", (scan_date,)).fetchone() is not None
+
+    def ingest(self, db_path, scan_date=None, started=None, version=None):
+        """
+        Appends the website_checks rows of a daily database as a new scan, returns the scan_id.
+
+        Args:
+        db_path (str): The daily database (YYYYMMDD/websites.db).
+        scan_date (str): YYYYMMDD, defaults to the name of the directory of the database.
+        started (str): When the scan started (optional).
+        version (str): scirtscan version, defaults to the version in the meta table of the database.
+        """
+        scan_date = scan_date or os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+        source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            if version is None:
+                row = source.execute("SELECT version FROM meta WHERE version IS NOT NULL").fetchone()
+                version = row[0] if row else None
+
+            # older databases don't have all columns
+            existing = {row[1] for row in source.execute("PRAGMA table_info(website_checks)")}
+            names = [column.name for column in RESULT_COLUMNS if column.name in existing]
+            rows = source.execute(f"SELECT websites, {', '.join(names)} FROM website_checks")
+
+            with self.conn:     # the scan and its results are added in one transaction
+                cursor = self.conn.execute("INSERT INTO scans (scan_date, started, version, source) VALUES (?, ?, ?, ?)",
+                                           (scan_date, started, version, os.path.abspath(db_path)))
+                scan_id = cursor.lastrowid
+                placeholders = ", ".join("?" * (len(names) + 2))
+                cursor.executemany(f"INSERT INTO results (scan_id, website, {', '.join(names)}) VALUES ({placeholders})",
+                                   ((scan_id,) + row for row in rows))
+                count = cursor.rowcount
+        finally:
+            source.close()
+
+        self.logger(f"history: scan {scan_id} ({scan_date}) added with {count} websites from {db_path}")
+        return scan_id
+
+    def website_history(self, website):
+        """
+        Returns (scan_date, grade, grade_check, check_date) for every scan of the website, oldest first.
+        """
+        return self.conn.execute('''
+            SELECT scans.scan_date, results.grade, results.grade_check, results.check_date
+            FROM results JOIN scans USING (scan_id)
+            WHERE results.website = ? ORDER BY scans.scan_date, scan_id
+        ''', (website,)).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='import daily websites.db files into the history database, or show the history of a website')
+    parser.add_argument('history', help='the history database (created if it does not exist)')
+    parser.add_argument('databases', nargs='*', help='daily databases to import, e.g. 2024*/websites.db')
+    parser.add_argument('-f', '--force', action='store_true', help='also import a database if there already is a scan for that date')
+    parser.add_argument('-w', '--website', type=str, help='show the grade history of this website')
+    args = parser.parse_args()
+
+    store = HistoryStore(args.history)
+    for db_path in sorted(args.databases):
+        scan_date = os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+        if store.has_scan(scan_date) and not args.force:
+            print(f"skipping {db_path}, there already is a scan for {scan_date}")
+            continue
+        try:
+            store.ingest(db_path, scan_date)
+        except sqlite3.Error as e:
+            print(f"failed to import {db_path}: {e}", file=sys.stderr)
+
+    if args.website:
+        for scan_date, grade, grade_check, check_date in store.website_history(args.website):
+            print(f"{scan_date} {grade} {grade_check} {check_date}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+###########################################################################################################
+# HTTP layer for the check modules
+# The checks are coroutines that await get() / head() from this module. By default the requests are done
+# with the (blocking) requests library in a helper thread. In async mode (scirtscan.py --async) they are
+# done with aiohttp on one shared event loop, so thousands of requests can be in flight without a thread
+# per request. Responses and exceptions are always requests objects, so the checks don't need to know which
+# engine is in use.
+# While a website is scanned (site_context) the responses are cached per website, so the homepage
+# is fetched once and serves all the header based checks, and the connections are pooled per scheme+host
+# (keep-alive), so the checks of a website share their TCP connections and TLS handshakes.
+# 20241018
+###########################################################################################################
+import asyncio
+import contextlib
+import contextvars
+import copy
+import threading
+from http import cookiejar
+from urllib.parse import urlsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from check_timing import note_failure
+import tracing
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None      # async mode is optional, see requirements_async.txt
+
+_engine = None          # AsyncEngine while running in async mode
+_site = contextvars.ContextVar("http_client_site", default=None)    # SiteContext of the website being scanned
+
+CACHE_BODY_LIMIT = 1024 * 1024      # responses with a larger body are not cached
+POOL_MAXSIZE = 16                   # connections kept alive per host, per website
+PROBE_DRAIN_LIMIT = 16 * 1024       # probe() reads bodies up to this size to keep the connection alive
+
+# totals for the whole run, updated when a site context is closed
+_stats_lock = threading.Lock()
+_stats = {"cache_hits": 0, "cache_misses": 0, "connections_opened": 0, "connections_reused": 0}
+
+
+def run(coro):
+    """
+    Runs a check coroutine to completion, this is what the blocking check functions use.
+
+    Args:
+    coro (coroutine): The coroutine to run.
+    """
+    return asyncio.run(coro)
+
+
+async def get(url, headers=None, timeout=None, allow_redirects=True):
+    return await request("GET", url, headers=headers, timeout=timeout, allow_redirects=allow_redirects)
+
+
+async def head(url, headers=None, timeout=None, allow_redirects=False):
+    return await request("HEAD", url, headers=headers, timeout=timeout, allow_redirects=allow_redirects)
+
+
+def current_site():
+    """
+    Returns the SiteContext of the website being scanned, or None.
+    """
+    return _site.get()
+
+
+async def probe(url, headers=None, timeout=None, body_limit=0):
+    """
+    GET for when only the status code and headers matter (e.g. remnants). The body is only read when
+    the Content-Length is small, so the connection can be reused; otherwise the connection is closed
+    right after the headers (or after body_limit bytes) and the returned response has no (or only
+    the first part of the) content. Probes are not cached.
+
+    Args:
+    url (str): The URL to request.
+    headers (dict): The headers to send with the request.
+    timeout (float): Connect and read timeout in seconds.
+    body_limit (int): Number of bytes of a large body to read anyway.
+    """
+    site = _site.get()
+    try:
+        with tracing.span(f"GET {url}", "request", probe=True):
+            if _engine is None:
+                session = site.session(url) if site else requests
+                return await asyncio.to_thread(_probe_blocking, session, url, headers, timeout, body_limit)
+            session = site.aiohttp_session(url) if site else None
+            return await _engine.request("GET", url, headers, timeout, True, session, probe=True, body_limit=body_limit)
+    except requests.exceptions.RequestException as e:
+        note_failure(e)     # for the outcome in the check timings, the check handles the error
+        raise
+
+
+def _probe_blocking(session, url, headers, timeout, body_limit):
+    response = session.get(url, headers=headers, timeout=timeout, stream=True)
+    if small_body(response.headers):
+        response.content        # reads the body, which puts the connection back in the pool
+    else:
+        body = response.raw.read(body_limit, decode_content=True) if body_limit else b""
+        response.close()
+        response._content = body
+        response._content_consumed = True
+    return response
+
+
+def small_body(headers):
+    length = headers.get("Content-Length", "")
+    return length.isdigit() and int(length) <= PROBE_DRAIN_LIMIT
+
+
+async def request(method, url, headers=None, timeout=None, allow_redirects=True):
+    """
+    Args:
+    method (str): HTTP method.
+    url (str): The URL to request.
+    headers (dict): The headers to send with the request.
+    timeout (float): Connect and read timeout in seconds, None waits forever (same as requests).
+    allow_redirects (bool): Whether to follow redirects.
+
+    Returns:
+    requests.Response: also in async mode, so the checks can keep using the requests API.
+    """
+    site = _site.get()
+    try:
+        with tracing.span(f"{method} {url}", "request"):
+            if site is not None:
+                return await site.request(method, url, headers, timeout, allow_redirects)
+            return await fetch(method, url, headers, timeout, allow_redirects)
+    except requests.exceptions.RequestException as e:
+        note_failure(e)     # for the outcome in the check timings, the check handles the error
+        raise
+
+
+async def fetch(method, url, headers, timeout, allow_redirects, site=None):
+    """
+    Does the request with the engine in use, without caching.
+    With a site the pooled connections of that website are used.
+    """
+    if _engine is None:
+        send = site.session(url).request if site else requests.request
+        return await asyncio.to_thread(send, method, url, headers=headers,
+                                       timeout=timeout, allow_redirects=allow_redirects)
+    session = site.aiohttp_session(url) if site else None
+    return await _engine.request(method, url, headers, timeout, allow_redirects, session)
+
+###########################################################################################################
+# per website context, holds the response cache and the connection pools
+###########################################################################################################
+class SiteContext:
+    """
+    Response cache for one website, keyed on (method, url, allow_redirects). A HEAD request is also
+    served from a cached GET of the same URL, since only the headers are used. Failed requests are
+    cached as well, so an unreachable homepage doesn't cost a timeout for every check.
+
+    The requests go through keep-alive sessions keyed on scheme+host (requests.Session, or an
+    aiohttp.ClientSession in async mode), which are closed when the website is done.
+    """
+
+    def __init__(self, website, logger):
+        self.website = website
+        self.logger = logger
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self.data = {}          # per website results shared between checks (e.g. not_found_baseline)
+        self.sessions = {}
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def session(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        if key not in self.sessions:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=POOL_MAXSIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            # requests.get() doesn't keep cookies between calls, the checks shouldn't influence each other
+            session.cookies.set_policy(cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            self.sessions[key] = session
+        return self.sessions[key]
+
+    def aiohttp_session(self, url):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        if key not in self.sessions:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._connection_opened)
+            trace_config.on_connection_reuseconn.append(self._connection_reused)
+            if tracing.enabled():
+                tracing.add_aiohttp_phases(trace_config)
+            self.sessions[key] = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0),
+                                                       cookie_jar=aiohttp.DummyCookieJar(),
+                                                       trace_configs=[trace_config])
+        return self.sessions[key]
+
+    async def _connection_opened(self, session, trace_config_ctx, params):
+        self.connections_opened += 1
+
+    async def _connection_reused(self, session, trace_config_ctx, params):
+        self.connections_reused += 1
+
+    async def request(self, method, url, headers, timeout, allow_redirects):
+        cached = self.lookup(method, url, allow_redirects)
+        if cached is not None:
+            self.hits += 1
+            if isinstance(cached, Exception):
+                raise cached
+            return cached
+
+        self.misses += 1
+        key = (method, url, allow_redirects)
+        try:
+            response = await fetch(method, url, headers, timeout, allow_redirects, self)
+        except requests.exceptions.RequestException as e:
+            self.cache[key] = e
+            raise
+        if len(response.content) <= CACHE_BODY_LIMIT:
+            self.cache[key] = response
+        return response
+
+    def lookup(self, method, url, allow_redirects):
+        cached = self.cache.get((method, url, allow_redirects))
+        if cached is None and method == "HEAD":
+            cached = self.cache.get(("GET", url, allow_redirects))
+            if isinstance(cached, requests.Response):
+                cached = copy.copy(cached)
+                cached._content = b""
+        return cached
+
+    async def close(self):
+        for session in self.sessions.values():
+            if isinstance(session, requests.Session):
+                self._count_pool_connections(session)
+                session.close()
+            else:
+                await session.close()
+        self.sessions.clear()
+
+        self.logger(f"http cache for {self.website}: {self.hits} hits, {self.misses} misses")
+        self.logger(f"http connections for {self.website}: {self.connections_opened} opened, {self.connections_reused} reused")
+        with _stats_lock:
+            _stats["cache_hits"] += self.hits
+            _stats["cache_misses"] += self.misses
+            _stats["connections_opened"] += self.connections_opened
+            _stats["connections_reused"] += self.connections_reused
+        self.cache.clear()
+
+    def _count_pool_connections(self, session):
+        # urllib3 counts the connections it made and the requests it did per connection pool
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                self.connections_opened += pool.num_connections
+                self.connections_reused += max(0, pool.num_requests - pool.num_connections)
+
+
+@contextlib.asynccontextmanager
+async def site_context(website, logger):
+    """
+    Enables the response cache and connection pooling for the requests done while scanning one website.
+    The context follows the coroutine (and its helper threads), so concurrent websites don't mix.
+
+    Args:
+    website (str): The website being checked.
+    logger (function pointer): Function to print debug information.
+    """
+    site = SiteContext(website, logger)
+    token = _site.set(site)
+    try:
+        with tracing.site(website):     # the spans of the website's checks and requests share a row in the trace
+            yield site
+    finally:
+        try:
+            await site.close()
+        finally:
+            _site.reset(token)
+
+
+def statistics():
+    """
+    Returns a one line summary of the HTTP statistics for the whole run.
+    """
+    with _stats_lock:
+        return (f"http cache: {_stats['cache_hits']} hits, {_stats['cache_misses']} misses; "
+                f"http connections: {_stats['connections_opened']} opened, {_stats['connections_reused']} reused")
+
+###########################################################################################################
+# async mode
+###########################################################################################################
+class AsyncEngine:
+    """
+    Does the requests with aiohttp (the session of the website, or a shared one), limited to max_requests in flight in total
+    and max_per_host in flight per host.
+    """
+
+    def __init__(self, session, max_requests, max_per_host):
+        self.session = session
+        self.requests_limit = asyncio.Semaphore(max_requests)
+        self.max_per_host = max_per_host
+        self.host_limits = {}
+
+    async def request(self, method, url, headers, timeout, allow_redirects, session=None, probe=False, body_limit=0):
+        session = session or self.session
+        host = urlsplit(url).hostname
+        host_limit = self.host_limits.setdefault(host, asyncio.Semaphore(self.max_per_host))
+
+        if timeout is None:
+            client_timeout = aiohttp.ClientTimeout(total=None)
+        else:
+            client_timeout = aiohttp.ClientTimeout(sock_connect=timeout, sock_read=timeout)
+
+        async with self.requests_limit, host_limit:
+            try:
+                async with session.request(method, url, headers=headers, timeout=client_timeout,
+                                           allow_redirects=allow_redirects) as resp:
+                    if probe and not small_body(resp.headers):
+                        body = await resp.content.read(body_limit) if body_limit else b""
+                        resp.close()
+                        return to_requests_response(resp, body)
+                    body = await resp.read()
+                    return to_requests_response(resp, body)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise to_requests_exception(e, method, url) from e
+
+
+def to_requests_response(resp, body=b""):
+    """
+    Converts an aiohttp response into a requests.Response.
+
+    Args:
+    resp (aiohttp.ClientResponse): The aiohttp response.
+    body (bytes): The response body.
+    """
+    response = requests.Response()
+    response.status_code = resp.status
+    response.reason = resp.reason
+    response.url = str(resp.url)
+
+    # requests folds repeated headers into one comma separated value, so do the same here
+    headers = CaseInsensitiveDict()
+    for key, value in resp.headers.items():
+        headers[key] = f"{headers[key]}, {value}" if key in headers else value
+    response.headers = headers
+    response.encoding = get_encoding_from_headers(headers)
+
+    response._content = body
+    response._content_consumed = True
+    response.history = [to_requests_response(r) for r in resp.history]
+    return response
+
+
+def to_requests_exception(error, method, url):
+    """
+    Maps an aiohttp exception on the requests exception that the checks already handle.
+    """
+    if isinstance(error, asyncio.TimeoutError):
+        return requests.exceptions.Timeout(f"{method} {url} timed out")
+    if isinstance(error, aiohttp.TooManyRedirects):
+        return requests.exceptions.TooManyRedirects(str(error))
+    if isinstance(error, aiohttp.ClientSSLError):
+        return requests.exceptions.SSLError(str(error))
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return requests.exceptions.ConnectionError(str(error))
+    if isinstance(error, aiohttp.InvalidURL):
+        return requests.exceptions.InvalidURL(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+
+@contextlib.asynccontextmanager
+async def async_engine(max_requests=100, max_per_host=4):
+    """
+    Switches get(), head() and request() to aiohttp for the duration of the with block.
+    Must be entered from the event loop that runs the checks.
+
+    Args:
+    max_requests (int): Maximum number of requests in flight.
+    max_per_host (int): Maximum number of requests in flight per host.
+    """
+    global _engine
+
+    if aiohttp is None:
+        raise RuntimeError("async mode needs aiohttp, see requirements_async.txt")
+
+    # the limits are done by our own semaphores, the cookie jar is disabled because
+    # the blocking mode doesn't keep cookies between requests either
+    connector = aiohttp.TCPConnector(limit=0)
+    session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+    _engine = AsyncEngine(session, max_requests, max_per_host)
+    try:
+        yield _engine
+    finally:
+        _engine = None
+        await session.close()
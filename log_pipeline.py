@@ -0,0 +1,123 @@
+###########################################################################################################
+# logging backend for debug_print
+# messages go through a queue to one writer thread, which writes them to a buffered debug.log (flushed every
+# FLUSH_INTERVAL seconds and at exit) and, with -d, to the console. Every message has a level and the website
+# it is about (the site tag), messages below the log level are dropped before they are queued.
+# In debug.log the lines of a website start with [website], so the lines of websites that are scanned at the
+# same time can be told apart. With json_lines every line is a JSON object with time, level, site and message.
+# The site tag defaults to the website that set_site() was called for in the current task or thread.
+# 20241018
+###########################################################################################################
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+
+FLUSH_INTERVAL = 1.0        # seconds before buffered lines are written to debug.log
+FILE_BUFFER = 64 * 1024     # bytes buffered for debug.log
+BATCH_SIZE = 1000           # messages written per wake-up of the writer thread
+
+_site = contextvars.ContextVar("log_pipeline_site", default="-")     # site tag of the website being scanned
+
+# the standard logging levels, so the names are the familiar ones
+LEVELS = {name: getattr(logging, name) for name in ["DEBUG", "INFO", "WARNING", "ERROR"]}
+
+def set_site(website):
+    """
+    Sets the site tag of the messages logged from the current task (or thread) and the threads it starts
+    with asyncio.to_thread. Every website is scanned in a task of its own, so the tag doesn't leak to the next.
+    """
+    _site.set(website)
+
+def text_line(site, msg):
+    # the tag goes after the empty lines some messages start with, so it is on the line with the text
+    if site == "-":
+        return f"{msg}\n"
+    text = msg.lstrip("\n")
+    return f"{msg[:len(msg) - len(text)]}[{site}] {text}\n"
+
+class LogPipeline:
+    """
+    Args:
+    path (str): The log file (debug.log), None for no log file.
+    level (str): Messages below this level are dropped (DEBUG, INFO, WARNING, ERROR).
+    console (bool): Also print the messages (without time, level and site tag) on the console.
+    json_lines (bool): Write the log file as JSON lines.
+    interval (float): Seconds before buffered messages are written.
+    """
+
+    def __init__(self, path=None, level="DEBUG", console=False, json_lines=False, interval=FLUSH_INTERVAL):
+        self.level = LEVELS[level]
+        self.console = console
+        self.json_lines = json_lines
+        self.interval = interval
+        self.file = open(path, "a", buffering=FILE_BUFFER) if path else None
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name="log_pipeline", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, msg, level=logging.INFO, site=None):
+        """
+        Queues a message, the site tag defaults to the website being scanned in this coroutine or thread.
+        """
+        if level < self.level or self.thread is None:
+            return
+        self.queue.put((time.time(), level, site or _site.get(), msg))
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.interval))
+                while batch[-1] is not None and len(batch) < BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            stop = bool(batch) and batch[-1] is None
+            self.write([item for item in batch if item is not None])
+            if stop or time.monotonic() - last_flush >= self.interval:
+                self.flush()
+                last_flush = time.monotonic()
+            if stop:
+                return
+
+    def write(self, batch):
+        if self.file:
+            try:
+                if self.json_lines:
+                    self.file.writelines(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(created)),
+                                                     "level": logging.getLevelName(level), "site": site, "msg": msg}) + "\n"
+                                         for created, level, site, msg in batch)
+                else:
+                    self.file.writelines(text_line(site, msg) for _, _, site, msg in batch)
+            except OSError as error:
+                print(f"failed to write to debug.log: {error}")
+        if self.console and batch:
+            sys.stdout.writelines(f"{msg}\n" for _, _, _, msg in batch)
+            sys.stdout.flush()      # the console is for watching the scan, so no waiting there
+
+    def flush(self):
+        try:
+            if self.file:
+                self.file.flush()
+        except OSError as error:
+            print(f"failed to write to debug.log: {error}")
+
+    def close(self):
+        """
+        Writes the messages that are still queued or buffered, safe to call more than once.
+        """
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+        if self.file:
+            self.file.close()
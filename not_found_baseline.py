@@ -0,0 +1,121 @@
+###########################################################################################################
+# what does the web server return for a path that doesn't exist?
+# the baseline (status, length, body similarity and redirect target of a random path) is computed once per
+# website and shared by check_error (which looks at the error page) and check_remnants (which compares
+# the remnant probes against it, so catch-all servers that return 200 on everything can still be checked)
+# 20241018
+###########################################################################################################
+import math
+import re
+import secrets
+import zlib
+from urllib.parse import urlsplit
+import requests
+import http_client
+
+SIGNATURE_SIZE = 64         # number of shingle hashes kept in the body signature
+SIMILARITY = 0.8            # estimated resemblance above which a body counts as the not found page
+BODY_PREFIX = 64 * 1024     # bytes of the body that are compared
+
+
+class NotFoundBaseline:
+    """
+    Args:
+    response (requests.Response): The response for a random path on the website.
+    path (str): The random path.
+    """
+
+    def __init__(self, response, path):
+        self.status = response.status_code
+        self.text = response.text
+        self.redirect = redirect_target(response, path)
+        self.length = length_bucket(response)
+        self.signature = body_signature(response.content[:BODY_PREFIX], path)
+
+    def matches(self, response, path):
+        """
+        Returns True if the response for path looks like the not found page.
+        """
+        target = redirect_target(response, path)
+        if target is not None and urlsplit(target).path in ("", "/"):
+            return True     # sent back to the homepage
+        if response.status_code != self.status or target != self.redirect:
+            return False
+        if self.status != 200:
+            return True     # same error status, so it's not there
+        length = length_bucket(response)
+        if length is not None and self.length is not None and abs(length - self.length) > 1:
+            return False
+        if not response.content:
+            return True     # nothing to compare, same status, redirect and length
+        return resemblance(self.signature, body_signature(response.content[:BODY_PREFIX], path)) >= SIMILARITY
+
+    def __str__(self):
+        return f"status {self.status}, length bucket {self.length}, redirect {self.redirect}"
+
+
+def redirect_target(response, path):
+    # where the request ended up, with the requested path taken out so different paths can be compared
+    if not response.history:
+        return None
+    return response.url.replace(path.lstrip("/"), "{path}")
+
+
+def length_bucket(response):
+    # buckets of ~20% so small differences (e.g. the path echoed in the page) don't matter
+    length = response.headers.get("Content-Length", "")
+    if length.isdigit():
+        length = int(length)
+    elif response.content and len(response.content) < BODY_PREFIX:
+        length = len(response.content)
+    else:
+        return None
+    return int(math.log(length + 1, 1.2))
+
+
+def body_signature(body, path):
+    """
+    Bottom-k signature of the 3-word shingles of the body, the path is removed because
+    many error pages echo the requested URL.
+    """
+    text = body.decode("utf-8", errors="replace").replace(path.lstrip("/"), "")
+    words = re.findall(r"\w+", text.lower())
+    shingles = {zlib.crc32(" ".join(words[i:i + 3]).encode()) for i in range(max(1, len(words) - 2))}
+    return sorted(shingles)[:SIGNATURE_SIZE]
+
+
+def resemblance(signature1, signature2):
+    # estimated Jaccard similarity from two bottom-k signatures
+    union = sorted(set(signature1) | set(signature2))[:SIGNATURE_SIZE]
+    if not union:
+        return 1.0
+    both = set(signature1) & set(signature2)
+    return sum(1 for h in union if h in both) / len(union)
+
+
+async def get_not_found_baseline(url, myheaders, logger):
+    """
+    Returns the NotFoundBaseline for the website, computed on the first call while scanning the website
+    and reused after that. Returns None if the random path couldn't be fetched.
+
+    Args:
+    url (str): The URL of the website.
+    myheaders (dict): The headers to send with the request.
+    logger (function pointer): Function to print debug information.
+    """
+    site = http_client.current_site()
+    if site is not None and "not_found_baseline" in site.data:
+        return site.data["not_found_baseline"]
+
+    path = "/" + secrets.token_hex(8)   # random path which should generate a 404 on the web server
+    try:
+        response = await http_client.get(url + path, headers=myheaders, timeout=5)
+        baseline = NotFoundBaseline(response, path)
+        logger(f"not found baseline for {url}: {baseline}")
+    except requests.RequestException as e:
+        logger(f"Failed to fetch not found baseline {url + path}: {str(e)}")
+        baseline = None
+
+    if site is not None:
+        site.data["not_found_baseline"] = baseline
+    return baseline
@@ -0,0 +1,119 @@
+###########################################################################################################
+# CPU profile of a whole run (scirtscan.py, sql2html.py and sql2excel.py --profile)
+# start() profiles the rest of the run with cProfile and registers the report with atexit, so it is also
+# written when the run ends with sys.exit(). In the date directory the report is:
+#   profile-<tool>.pstats   the full profile, for pstats, snakeviz or gprof2dot
+#   profile-<tool>.txt      wall and CPU time and the top functions by own time and by cumulative time
+# A CPU time far below the wall time means the run was mostly waiting, not computing.
+# Before Python 3.12 every thread that is started after start() gets its own profiler (the check threads of
+# asyncio.to_thread and -w) and they are combined. These profilers time the functions in CPU time of their
+# thread, so waiting for the network, testssl.sh or SSL Labs doesn't push the Python work out of the summary.
+# Python 3.12+ profiles all threads with one profiler, its clock has to be the same for every thread, so
+# there the functions are timed in wall time.
+# 20241018
+###########################################################################################################
+import atexit
+import cProfile
+import io
+import os
+import platform
+import pstats
+import sys
+import threading
+import time
+
+TOP = 30        # functions in the summary
+
+class Profiler:
+    """
+    Args:
+    directory_path (str): The directory the report is written to (the date directory).
+    tool (str): Name of the tool, used in the file names (scirtscan, sql2html, sql2excel).
+    logger (function pointer): Function to print debug information.
+    version (str): Version of the tool, in the summary so profiles of different versions can be compared.
+    top (int): Number of functions in the summary.
+    """
+
+    def __init__(self, directory_path, tool, logger=print, version=None, top=TOP):
+        self.directory_path = directory_path
+        self.tool = tool
+        self.logger = logger
+        self.version = version
+        self.top = top
+        self.lock = threading.Lock()
+        self.thread_profiles = []
+        # since 3.12 cProfile uses sys.monitoring, which sees every thread with the one profiler,
+        # the CPU clocks of different threads can't be mixed in its timings
+        self.per_thread = sys.version_info < (3, 12)
+        self.timer = time.thread_time if self.per_thread else time.perf_counter
+        self.unit = "CPU seconds" if self.per_thread else "wall seconds"
+        self.profile = cProfile.Profile(self.timer)
+
+    def start(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        if self.per_thread:
+            threading.setprofile(self.start_thread)
+        self.profile.enable()
+        atexit.register(self.stop)
+
+    def start_thread(self, frame, event, arg):
+        # called for the first event of a new thread, the thread's own profiler takes over from here
+        profile = cProfile.Profile(self.timer)
+        with self.lock:
+            self.thread_profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        """
+        Stops profiling and writes the report, registered with atexit by start().
+        """
+        self.profile.disable()
+        if self.per_thread:
+            threading.setprofile(None)
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+
+        stats = pstats.Stats(self.profile)
+        with self.lock:
+            for profile in self.thread_profiles:
+                profile.disable()
+                try:
+                    stats.add(profile)
+                except TypeError:
+                    pass        # a thread that didn't call anything
+        base = os.path.join(self.directory_path, f"profile-{self.tool}")
+        stats.dump_stats(f"{base}.pstats")
+
+        header = [f"{self.tool} {self.version or ''}".rstrip() + f", python {platform.python_version()}",
+                  f"command: {' '.join(sys.argv)}",
+                  f"wall time: {wall:.2f} seconds, CPU time: {cpu:.2f} seconds ({100 * cpu / wall if wall else 0:.0f}%)",
+                  f"threads profiled: {1 + len(self.thread_profiles)}"]
+        with open(f"{base}.txt", "w") as report:
+            report.write("\n".join(header) + "\n")
+            for order in ["tottime", "cumulative"]:
+                report.write(f"\n===========top {self.top} functions by {order} ({self.unit})\n")
+                report.write(self.table(stats, order))
+
+        for line in header[2:]:
+            self.logger(line)
+        self.logger(f"top {min(self.top, 10)} functions by own time ({self.unit}):")
+        self.logger(self.table(stats, "tottime", min(self.top, 10)).rstrip())
+        self.logger(f"profile written to {base}.txt and {base}.pstats")
+
+    def table(self, stats, order, top=None):
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(order).print_stats(top or self.top)
+        # print_stats starts with the totals and the ordering, the table starts at the column header
+        lines = output.getvalue().splitlines()
+        start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+        return "\n".join(line for line in lines[start:] if line.strip()) + "\n"
+
+def start(directory_path, tool, logger=print, version=None, top=TOP):
+    """
+    Profiles the rest of the run, the report is written to the directory when the process exits.
+    """
+    profiler = Profiler(directory_path, tool, logger, version, top)
+    profiler.start()
+    return profiler
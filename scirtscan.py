@@ -8,21 +8,37 @@ import re
 import sys
 import time
 import datetime
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # importing scirtscan check functions
-from check_dns import check_dns
-from check_http_headers import check_http_headers
-from check_https_reachable import check_https_reachable
-from check_versioninfo import check_versioninfo
-from check_robots import check_robots
-from check_error import check_error
-from check_security_file import check_security_file
-from check_remnants import check_remnants
+from check_dns import check_dns, resolve_website, resolve_websites, DNS_CONCURRENCY, DNS_DEADLINE
+from check_http_headers import check_http_headers_async
+from check_https_reachable import check_https_reachable_async
+from check_versioninfo import check_versioninfo_async
+from check_robots import check_robots_async
+from check_error import check_error_async
+from check_security_file import check_security_file_async
+from check_remnants import check_remnants_async
 from check_ssl_certificate_validity import check_ssl_certificate_validity
-from check_http_redirected_to_https import check_http_redirected_to_https
-from check_debug_in_headers import check_debug_in_headers
-from check_testssl import check_testssl
-from check_sslscore import check_sslscore
+from check_http_redirected_to_https import check_http_redirected_to_https_async
+from check_debug_in_headers import check_debug_in_headers_async
+from check_testssl import check_testssl_batch, TESTSSL_TIMEOUT
+from check_sslscore import check_sslscore, SSLLABS_API
+from grade_cache import GradeCache
+from file_cache import FileCache
+import check_timing
+from columns import COLUMNS, create_table_sql, structure
+from artifact_store import ArtifactStore, ARTIFACTS_DB, open_artifact
+from dns_cache import DNSCache
+from db_writer import DBWriter
+from history import HistoryStore
+import http_client
+import tracing
+import profiler
+from log_pipeline import LogPipeline, set_site
 
 version = "v3.0 20240701"
 
@@ -48,7 +64,27 @@ parser.add_argument('-nq','--no_qualys', action='store_true', help='exclude qual
 parser.add_argument('-oq','--only_qualys', action='store_true', help='only do qualys ssltest (skip other tests)')
 parser.add_argument('-t','--testssl', action='store_true', help='use locally installed testssl.sh instead of qualys')
 parser.add_argument('-ot','--only_testssl', action='store_true', help='only do testssl.sh checks on websites')
+parser.add_argument('-tw','--testssl_workers', type=int, default=4, help='number of testssl.sh processes to run in parallel (default: 4)')
+parser.add_argument('--testssl_timeout', type=int, default=TESTSSL_TIMEOUT, help=f'seconds before a testssl.sh run is killed (default: {TESTSSL_TIMEOUT})')
 parser.add_argument('-nc','--no_cache', action='store_true', help='always request fresh tests from qualys')
+parser.add_argument('-gc', '--grade_cache', type=str, help='file (outside the date directory) to cache TLS grades between runs, a grade is reused while the IPs and certificate don\'t change')
+parser.add_argument('--grade_max_age', type=float, default=7, help='maximum age in days of a grade from the grade cache (default: 7)')
+parser.add_argument('-fc', '--file_cache', type=str, help='file (outside the date directory) to keep robots.txt and security.txt between runs, they are only downloaded again when they changed')
+parser.add_argument('--artifacts', action='store_true', help=f'store the per-site outputs compressed in {ARTIFACTS_DB} in the date directory instead of loose files')
+parser.add_argument('--ssllabs_api', type=str, default=SSLLABS_API, help=f'SSL Labs API to use, e.g. a local stand-in for testing (default: {SSLLABS_API})')
+parser.add_argument('-w', '--workers', type=int, default=1, help='number of websites to scan in parallel, on Ctrl-C the websites in progress stop after their current check (default: 1)')
+parser.add_argument('--async', dest='use_async', action='store_true', help='do the HTTP checks as coroutines on one event loop (needs aiohttp), -w sets the number of websites in progress')
+parser.add_argument('--max_requests', type=int, default=100, help='async mode: maximum number of HTTP requests in flight (default: 100)')
+parser.add_argument('--max_per_host', type=int, default=4, help='async mode: maximum number of HTTP requests in flight per host (default: 4)')
+parser.add_argument('--dns_workers', type=int, default=DNS_CONCURRENCY, help=f'number of websites resolved at the same time in the DNS stage (default: {DNS_CONCURRENCY})')
+parser.add_argument('--dns_timeout', type=float, default=DNS_DEADLINE, help=f'seconds for a single DNS query (default: {DNS_DEADLINE})')
+parser.add_argument('--dns_cache', type=str, help='file (outside the date directory) to keep the DNS cache between runs, records are used until their TTL expires')
+parser.add_argument('--history', type=str, help='history database (outside the date directory) to add the results of this scan to')
+parser.add_argument('-r', '--resume', action='store_true', help='resume an interrupted scan of today, the checks, testssl.sh runs and SSL Labs assessments that are done are skipped')
+parser.add_argument('--trace', action='store_true', help='write the timings of the checks and of the DNS, connect, TLS and time to first byte phases of every request to trace.json in the date directory')
+parser.add_argument('--profile', action='store_true', help='profile the run, the hottest functions are written to profile-scirtscan.txt (and the full profile to profile-scirtscan.pstats) in the date directory')
+parser.add_argument('-ll', '--log_level', type=str.upper, default='DEBUG', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='messages below this level are left out of debug.log and the console (default: DEBUG)')
+parser.add_argument('--log_json', action='store_true', help='write debug.log as JSON lines (time, level, site, message)')
 parser.add_argument('-ndf', '--no_debugfile', action='store_true', help='Don\'t save debug output to debug.log in the YYYYMMDD directory')
 parser.add_argument('filename', metavar='FILENAME', type=str, nargs='?', const=None, help='filename with list of websites')
 args = parser.parse_args()
@@ -68,18 +104,18 @@ skip_debug_file = args.no_debugfile
 if not skip_debug_file:
     print(f"debug.log output written to {debug_file_path}")
 
+log = LogPipeline(None if skip_debug_file else debug_file_path, args.log_level, debug, args.log_json)
+
 ###########################################################################################################
 # support function to print debug information
+# the messages are queued for the log writer (see log_pipeline.py), the site tag is the website that is
+# being scanned, unless given
 ###########################################################################################################
-def debug_print(msg):
-    if not skip_debug_file:      
-        with open(debug_file_path, 'a') as f:
-            try:
-                f.write(msg + '\n')
-            except OSError as error:
-                print(f"failed to write to debug.log: {error}")
-    if debug:
-        print(msg)
+def debug_print(msg, level=logging.INFO, site=None):
+    log.log(msg, level, site)
+
+if args.profile:
+    profiler.start(directory_path, "scirtscan", debug_print, version)
 
 
 xqualys = args.no_qualys
@@ -103,6 +139,29 @@ testssl = args.testssl
 if testssl:
     debug_print("using locally installed testssh.sh instead of Qualys SSLtest")
 
+grade_cache = None
+if args.grade_cache and usecache:
+    grade_cache = GradeCache(args.grade_cache, args.grade_max_age, debug_print)
+
+file_cache = None
+if args.file_cache:
+    file_cache = FileCache(args.file_cache, debug_print)
+
+artifacts = None
+if args.artifacts:
+    artifacts = ArtifactStore(os.path.join(directory_path, ARTIFACTS_DB), debug_print)
+    artifacts.install()
+    debug_print(f"storing the per-site outputs in {artifacts.path}")
+
+workers = max(1, args.workers)
+aborting = threading.Event()     # set on Ctrl-C, the -w workers stop after the check they are running
+
+use_async = args.use_async
+max_requests = max(1, args.max_requests)
+max_per_host = max(1, args.max_per_host)
+if use_async and http_client.aiohttp is None:
+    sys.exit("--async needs aiohttp, install it with: pip3 install -r requirements_async.txt")
+
 filename = args.filename
 
 debug_print(f"ScirtScan version: {version}, check started on: {time_string}")
@@ -141,6 +200,7 @@ def setup_database(directory_path, db_filename='websites.db'):
     db_path = os.path.join(directory_path, db_filename)
     try:
         conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=WAL")     # the results are written by DBWriter, readers don't block it
         debug_print(f"Connected to database {db_path}.")
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
@@ -148,67 +208,244 @@ def setup_database(directory_path, db_filename='websites.db'):
 
     cursor = conn.cursor()
     
-    # Create a table to store the check results, most checks will store a boolean, 1 for OK and 0 for FAIL
-    ####=> for all INT values, 1 = Good, meaning the check did find that the website was compliant with the security check,
-    #      or there was no information found that the website was incompliant with the security check.
-    #      0 = Bad, empty = ? (don't know)
+    # Create a table to store the check results, the columns are defined in columns.py
+    cursor.execute(create_table_sql())
+
+    # columns added in later versions, for a database that was created earlier today by an older version
+    existing_columns = [row[1] for row in cursor.execute("PRAGMA table_info(website_checks)")]
+    for column in COLUMNS:
+        if column.name not in existing_columns:
+            cursor.execute(f"ALTER TABLE website_checks ADD COLUMN {column.name} {column.type}")
+
+    # certificate facts from check_ssl_certificate_validity, for the checks that need them later on
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS website_checks
+    CREATE TABLE IF NOT EXISTS certificates
     (
         websites TEXT PRIMARY KEY,
-        https_reachable INT,             -- whether the website is reachable through HTTPS (on port443)
-        grade TEXT,                      -- what is the Qualys SSLtest score (e.g. A+)
-        grade_check INT,                 -- is Qualys SSLtest score compliant with our requirements (e.g. > A-)
-        redirect_check INT,              -- are HTTP requests redirected to HTTPS ?
-        cert_validity INT,               -- how many days before the certificate expires
-        hsts INT,                        -- HTTP Strict Transport Security
-        security_txt INT,                -- is .well-known/security.txt present?
-        version_check INT,               -- no version information disclosed in HTTP headers
-        robots_check INT,                -- only Allow in robots.txt
-        error_check INT,                 -- no version information disclosed in HTTP error page (404)
-        remnants INT,                    -- whether there are remnants of CMS installation files on the website
-        debug INT,                       -- if the HTTP headers returned contain the word debug (because you might want to investigate)
-        headers_check INT,               -- required HTTP security headers present?
-        check_date TEXT                  -- when were the checks performed
+        ip TEXT,                         -- address the certificate was retrieved from
+        fingerprint TEXT,                -- SHA-256 of the leaf certificate (DER)
+        not_after TEXT,                  -- expiry of the leaf certificate (UTC)
+        issuer TEXT,
+        subject TEXT,
+        chain_length INT,                -- number of certificates in the verified chain
+        der BLOB                         -- the leaf certificate
+    )
+    ''')
+
+    # how long every check took per website, and whether its requests timed out or failed
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS check_timings
+    (
+        websites TEXT,
+        check_name TEXT,                 -- the step name, e.g. dns, headers, certificate, testssl
+        started TEXT,
+        seconds REAL,
+        outcome TEXT,                    -- ok, timeout or error (a request of the check failed)
+        error TEXT,                      -- the last failure, if any
+        PRIMARY KEY (websites, check_name)
+    )
+    ''')
+
+    # the steps (checks, testssl.sh, SSL Labs) that are done per website, for --resume
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS checkpoints
+    (
+        websites TEXT,
+        step TEXT,                       -- e.g. dns, headers, scan (all checks done), testssl, ssllabs_started, ssllabs
+        done_at TEXT,
+        PRIMARY KEY (websites, step)
     )
     ''')
 
     cursor.execute("CREATE TABLE IF NOT EXISTS meta (structure TEXT, version TEXT)")
 
     # Inserting table structure and version meta data
-    table_structure = """
-    (   websites TEXT, https_reachable INT, grade TEXT, grade_check INT, redirect_check INT, cert_validity INT, hsts INT,
-        security_txt INT, version_check INT, error_check INT, remnants INT, debug INT, headers_check INT,
-        check_date TEXT )
-    """
+    table_structure = structure()
     try:
         cursor.execute("INSERT INTO meta (structure) VALUES (?)", (table_structure,))
         cursor.execute("INSERT INTO meta (version) VALUES (?)", (version,))  # version needs to be defined or passed
     except sqlite3.Error as error:
         print("Failed to insert structure and version into table meta", error)
+    conn.commit()
 
     return conn, cursor
 
 ###########################################################################################################
-# store results in sqlite database
+# run all checks for a single website
 ###########################################################################################################
-#import sqlite3
-def update_website_checks(website, columns, db_cursor, db_connection):
-    try:
-        # db_connection = sqlite3.connect(db_path)
-        # db_cursor = db_connection.cursor()
-        
-        # Construct the SQL update query dynamically based on the provided columns
-        set_clause = ", ".join([f"{column} = ?" for column in columns])
-        query = f"UPDATE website_checks SET {set_clause} WHERE websites = ?"
-        
-        # Execute the update query
-        db_cursor.execute(query, list(columns.values()) + [website])
-        db_connection.commit()
-        debug_print(f"Record updated {website}, {columns}")
-    
-    except sqlite3.Error as error:
-        print("Failed to update data in table", error)
+class ScanAborted(Exception):
+    pass
+
+async def scan_website(website, headers, logger, store, records=None, resume=None):
+    """
+    Runs the per website checks and writes the detailed log to {website}.html in the date directory.
+    The HTTP checks are awaited, the blocking checks (DNS, certificate) run in a helper thread.
+    Every check that is done is stored as a checkpoint, with resume the checks that were already done by an
+    interrupted run are skipped (their results are in the database and the detailed log already).
+
+    Args:
+    website (str): The website being checked.
+    headers (dict): The headers to send with the requests.
+    logger (function pointer): Function to print debug information.
+    store (function pointer): Function to store a dict of column values for this website in the database,
+                              in website_checks or in the table given as second argument.
+    records (dict): The DNS records of the website from the DNS stage.
+    resume (dict): "steps", the checkpoints of this website, and "row", its website_checks row (optional).
+
+    Returns:
+    bool: True if the website is reachable over HTTPS and should be passed to the Qualys ssltest (or testssl.sh).
+    """
+    set_site(website)       # the site tag of the messages logged while this website is scanned
+    online = False
+    done = resume["steps"] if resume else set()
+    previous = resume["row"] if resume else {}
+
+    def finished(step):
+        store({"step": step}, "checkpoints")
+        outfile.flush()     # with --artifacts the detailed log so far goes to the store, not kept in memory
+        if aborting.is_set():
+            raise ScanAborted(website)
+
+    # the site context caches the HTTP responses and pools the connections for this website
+    async with http_client.site_context(website, logger):
+        with open_artifact(directory_path, f"{website}.html", "a") as outfile:      # set this to "a" if you want to append to an existing outfile
+            check_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+            if done:
+                outfile.write(f"\n{website} checks resumed on: {check_date}\n")
+                logger(f"\n===============================================> {website} (resumed, done: {sorted(done)})")
+            else:
+                outfile.write("<html>\n<body>\n<pre>\n")
+                outfile.write(f"{website} checks started on: {check_date}\n")
+                logger(f"\n===============================================> {website}")
+
+            if "dns" not in done and records is None:         # not resolved in the DNS stage
+                started = time.monotonic()
+                records = await resolve_website(website)
+                records["seconds"] = time.monotonic() - started
+            if "dns" not in done:
+                check_timing.record("dns", store, records["seconds"], check_timing.dns_outcome(records), records["error"])
+            if "dns" in done or check_dns(website, outfile, logger, records):
+                url = f"https://{website}"
+                if "dns" not in done:
+                    store({"check_date": check_date})
+                    finished("dns")
+
+                if "https" in done:
+                    https = previous.get("https_reachable")
+                else:
+                    async with check_timing.timed("https", store):
+                        https = await check_https_reachable_async(website, url, outfile, logger, headers)
+                    store({"https_reachable": https})
+                    finished("https")
+
+                if https:       # only do the checks if the website is reachable over HTTPS
+                    online = True
+
+                    if oqualys or otestssl:     # only do the ssltest, it runs after all websites are scanned
+                        finished("scan")
+                        return online
+
+                    if "headers" not in done:
+                        async with check_timing.timed("headers", store):
+                            check_header, hsts_duration_days = await check_http_headers_async(website, url, outfile, logger, headers)
+                        store({"hsts": hsts_duration_days, "headers_check": check_header})
+                        finished("headers")
+
+                    if "versioninfo" not in done:
+                        async with check_timing.timed("versioninfo", store):
+                            versioninfo = await check_versioninfo_async(website, url, outfile, logger, headers)
+                        store({"version_check": versioninfo})
+                        finished("versioninfo")
+
+                    if "robots" not in done:
+                        async with check_timing.timed("robots", store):
+                            robo = await check_robots_async(website, url, outfile, logger, headers, file_cache)
+                        store({"robots_check": robo})
+                        finished("robots")
+
+                    if "error" not in done:
+                        async with check_timing.timed("error", store):
+                            err, html_content = await check_error_async(website, url, outfile, logger, headers)
+                        store({"error_check": err})
+                        errfile = os.path.join(directory_path, f"{website}-error.txt")
+                        with open_artifact(directory_path, f"{website}-error.txt", "w") as outerrfile:
+                            try:
+                                outerrfile.write(f"{html_content}")
+                                outfile.write(f"\n<a href=\"{website}-error.txt\">{website}-error.txt</a>\n")
+                            except OSError as e:
+                                sys.exit(f"Error trying to open for writing {errfile}: {e}")
+                        finished("error")
+
+                    if "security_txt" not in done:
+                        async with check_timing.timed("security_txt", store):
+                            secfile = await check_security_file_async(website, url, outfile, logger, headers, file_cache)
+                        store({"security_txt": secfile})
+                        finished("security_txt")
+
+                    if "remnants" not in done:
+                        async with check_timing.timed("remnants", store):
+                            remnant = await check_remnants_async(website, url, outfile, logger, headers, read_lines_from_file)
+                        store({"remnants": remnant})
+                        finished("remnants")
+
+                    if "certificate" not in done:
+                        facts = {}
+                        async with check_timing.timed("certificate", store):
+                            certv = await asyncio.to_thread(check_ssl_certificate_validity, website, outfile, logger, facts)
+                        store({"cert_validity": certv})
+                        if "certificate" in facts:
+                            store(facts["certificate"], "certificates")
+                        finished("certificate")
+
+                    if "redirect" not in done:
+                        async with check_timing.timed("redirect", store):
+                            redir = await check_http_redirected_to_https_async(website, outfile, logger, headers)
+                        store({"redirect_check": redir})
+                        finished("redirect")
+
+                    if "debug" not in done:
+                        async with check_timing.timed("debug", store):
+                            dbg = await check_debug_in_headers_async(website, url, outfile, logger, headers)
+                        store({"debug": dbg})
+                        finished("debug")
+
+            if xqualys:
+                done_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+                outfile.write(f"{website} checks done at: {done_date} \n")
+                outfile.write("</pre>\n</body>\n</html>")
+            finished("scan")
+
+    return online
+
+###########################################################################################################
+# run scan_website with recorded output, the debug messages are recorded so the main thread can replay them
+# in input order (same output as the sequential mode), the results go to the database writer right away
+###########################################################################################################
+async def scan_website_recorded(website, headers, website_store, records=None, resume=None):
+    events = []
+    logger = lambda msg, level=logging.INFO: events.append((msg, level))
+    online = await scan_website(website, headers, logger, website_store(website, logger), records, resume)
+    return online, events
+
+def scan_website_thread(website, headers, website_store, records=None, resume=None):
+    return asyncio.run(scan_website_recorded(website, headers, website_store, records, resume))
+
+###########################################################################################################
+# async mode: scan the websites as tasks on one event loop, at most `workers` websites at the same time
+# and the HTTP requests limited by --max_requests and --max_per_host
+###########################################################################################################
+async def scan_websites_async(inlines, headers, replay, website_store, dns_records, resume_of):
+    site_limit = asyncio.Semaphore(workers)
+
+    async def scan(website):
+        async with site_limit:
+            return await scan_website_recorded(website, headers, website_store, dns_records.get(website), resume_of(website))
+
+    async with http_client.async_engine(max_requests, max_per_host):
+        tasks = [asyncio.create_task(scan(website)) for website in inlines]
+        for website, task in zip(inlines, tasks):
+            online, events = await task
+            replay(website, online, events)
 
 ###########################################################################################################
 ############################################# Main code block #############################################
@@ -216,8 +453,6 @@ def update_website_checks(website, columns, db_cursor, db_connection):
 def main():
 
     websites = []   # list of online websites tho pass to sslscan
-    websites2 = []   # list of online websites that failed to produce a grade on the first time
-
 
     # HTTP GET/POST headers for normal (e.g. API calls) operation
     aheaders = {
@@ -244,100 +479,127 @@ def main():
     
     debug_print(f"websites will be read from: {filename}")
 
+    # what an interrupted scan of today already did, a new scan starts without checkpoints
+    checkpoints = {}        # website -> steps done
+    previous_rows = {}      # website -> website_checks row
+    if args.resume:
+        for website, step in db_cursor.execute("SELECT websites, step FROM checkpoints"):
+            checkpoints.setdefault(website, set()).add(step)
+        db_cursor.execute("SELECT * FROM website_checks")
+        names = [column[0] for column in db_cursor.description]
+        previous_rows = {row[0]: dict(zip(names, row)) for row in db_cursor.fetchall()}
+    else:
+        db_cursor.execute("DELETE FROM checkpoints")
+        db_connection.commit()
+
+    def resume_of(website):
+        if website not in checkpoints:
+            return None
+        return {"steps": checkpoints[website], "row": previous_rows.get(website, {})}
+
+    def steps_done(website):
+        return checkpoints.get(website, set())
+
+    # all results are written by one writer thread, the updates for a website are merged into one upsert
+    db_writer = DBWriter(os.path.join(directory_path, "websites.db"), debug_print)
+
+    def website_store(website, logger=debug_print):
+        def store(columns, table="website_checks"):
+            if table == "checkpoints":
+                db_writer.checkpoint(website, columns["step"])
+                return
+            if table == "check_timings":
+                db_writer.insert(table, {"websites": website, **columns})
+                return
+            db_writer.put(website, columns, table)
+            logger(f"Record updated {website}, {columns if table == 'website_checks' else table}", logging.DEBUG)
+        return store
+
+    executor = None
+    tracer = None
+    dns_cache = None
     try:
         with open(filename, 'r') as file:
             inlines = [line.strip() for line in file if not line.strip().startswith("#")]
 
-        websites = []
-  
-        for website in inlines:
-            myfile = os.path.join(directory_path, f"{website}.html")
-
-            with open(myfile, "a") as outfile:      # set this to "a" if you want to append to an existing outfile
-                outfile.write("<html>\n<body>\n<pre>\n")
-                check_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
-                outfile.write(f"{website} checks started on: {check_date}\n")
-
-                debug_print(f"\n===============================================> {website}")
-                if check_dns(website, outfile, debug_print):
-                    url = f"https://{website}"
-
-                    # only write the website name as primary key if there is no row with that info
-                    db_cursor.execute("INSERT INTO website_checks (websites) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM website_checks WHERE websites = ?)", (website,website))
-                    db_cursor.execute("UPDATE website_checks SET check_date = ? WHERE websites = ?", (check_date, website))
-                    db_connection.commit()
-
-                    https = check_https_reachable(website, url, outfile, debug_print, headers)
-                    update_website_checks(website, {"https_reachable": https}, db_cursor, db_connection)
-
-                    if https:       # only do the checks if the website is reachable over HTTPS
-                        websites.append(website)    # store website in list for Qualys SSLscan
-
-                        if oqualys:         # only do qualys checks
-                            continue
-
-                        if otestssl:        # only do testssl checks
-                            for website in websites:
-                                gr, checkssl = check_testssl(website, outfile, debug_print)
-                                update_website_checks(website, {"grade": gr, "grade_check": checkssl}, db_cursor, db_connection)
-                            continue
-                        else:
-
-                            check_header, hsts_duration_days = check_http_headers(website, url, outfile, debug_print, headers)
-                            update_website_checks(website, {"hsts": hsts_duration_days, "headers_check": check_header}, db_cursor, db_connection)
-
-                            versioninfo = check_versioninfo(website, url, outfile, debug_print, headers)
-                            update_website_checks(website, {"version_check": versioninfo}, db_cursor, db_connection)
-
-                            robo = check_robots(website, url, outfile, debug_print, headers)
-                            update_website_checks(website, {"robots_check": robo}, db_cursor, db_connection)
-
-                            err, html_content = check_error(website, url, outfile, debug_print, headers)
-                            update_website_checks(website, {"error_check": err}, db_cursor, db_connection)
-                            errfile = os.path.join(directory_path, f"{website}-error.txt")
-                            with open(errfile, "w") as outerrfile:
-                                try:
-                                    outerrfile.write(f"{html_content}")
-                                    outfile.write(f"\n<a href=\"{website}-error.txt\">{website}-error.txt</a>\n")
-                                except OSError as e:
-                                    sys.exit(f"Error trying to open for writing {errfile}: {e}")
-                            outerrfile.close()
-
-                            secfile = check_security_file(website, url, outfile, debug_print, headers)
-                            update_website_checks(website, {"security_txt": secfile}, db_cursor, db_connection)
-
-                            remnant = check_remnants(website, url, outfile, debug_print, headers, read_lines_from_file)
-                            update_website_checks(website, {"remnants": remnant}, db_cursor, db_connection)
-
-                            certv = check_ssl_certificate_validity(website, outfile, debug_print)
-                            update_website_checks(website, {"cert_validity": certv}, db_cursor, db_connection)
-
-                            redir = check_http_redirected_to_https(website, outfile, debug_print, headers)
-                            update_website_checks(website, {"redirect_check": redir}, db_cursor, db_connection)
-
-                            dbg = check_debug_in_headers(website, url, outfile, debug_print, headers)
-                            update_website_checks(website, {"debug": dbg}, db_cursor, db_connection)
-
-                            if testssl:
-                                gr, checkssl = check_testssl(website, outfile, debug_print)
-                                update_website_checks(website, {"grade": gr, "grade_check": checkssl}, db_cursor, db_connection)
-
-                if xqualys:
-                    done_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
-                    outfile.write(f"{website} checks done at: {done_date} \n")
-                    outfile.write("</pre>\n</body>\n</html>")
-                    outfile.close()
+        # websites that were completely scanned by an interrupted run only take part in the ssltest
+        to_scan = [website for website in inlines if "scan" not in steps_done(website)]
+        websites = [website for website in inlines if website not in to_scan and previous_rows.get(website, {}).get("https_reachable") == 1]
+        if args.resume:
+            debug_print(f"resuming: {len(inlines) - len(to_scan)} websites already scanned, {len(to_scan)} to go")
+
+        # all hostname lookups in this process (requests, aiohttp, ssl, sockets) go through the DNS cache
+        dns_cache = DNSCache(args.dns_cache, debug_print)
+        dns_cache.install()
+        if args.trace:
+            tracer = tracing.Tracer(os.path.join(directory_path, "trace.json"), debug_print)
+            tracer.install()    # after the DNS cache, so the lookups it answers are traced too
+
+        # resolve all websites up front, websites that don't resolve are done after the DNS check
+        unresolved = [website for website in to_scan if "dns" not in steps_done(website)]
+        dns_records = asyncio.run(resolve_websites(unresolved, debug_print, max(1, args.dns_workers), args.dns_timeout, dns_cache))
+
+        def replay(website, online, events):
+            for msg, level in events:
+                debug_print(msg, level, website)
+            if online:
+                websites.append(website)    # store website in list for Qualys SSLscan
+
+        if use_async:
+            debug_print(f"scanning async, {workers} websites and {max_requests} requests ({max_per_host} per host) at a time")
+            asyncio.run(scan_websites_async(to_scan, headers, replay, website_store, dns_records, resume_of))
+        elif workers > 1:
+            debug_print(f"scanning with {workers} workers")
+            executor = ThreadPoolExecutor(max_workers=workers)
+            scans = executor.map(scan_website_thread, to_scan, [headers] * len(to_scan), [website_store] * len(to_scan),
+                                 [dns_records.get(website) for website in to_scan], [resume_of(website) for website in to_scan])
+            for website, (online, events) in zip(to_scan, scans):
+                replay(website, online, events)
+            executor.shutdown()
+        else:
+            for website in to_scan:
+                if asyncio.run(scan_website(website, headers, debug_print, website_store(website), dns_records.get(website), resume_of(website))):
+                    websites.append(website)    # store website in list for Qualys SSLscan
+
+        order = {website: index for index, website in enumerate(inlines)}
+        websites.sort(key=order.get)
+
+        # the grade cache identifies the endpoints with the certificates found in this run
+        if grade_cache:
+            db_writer.flush()
+            grade_cache.fingerprints = dict(db_cursor.execute("SELECT websites, fingerprint FROM certificates"))
+
+        # testssl.sh runs after all the websites have been gone through all the checks above
+        if testssl or otestssl:
+            websites = [website for website in websites if "testssl" not in steps_done(website)]
+            debug_print(f"\n===============================================> starting testssl.sh for:\n{websites}")
+
+            def testssl_done(website, grade, check_score, runtime):
+                store = website_store(website)
+                store({"grade": grade, "grade_check": check_score, "testssl_runtime": runtime})
+                check_timing.record_testssl(store, grade, runtime, args.testssl_timeout)
+                db_writer.checkpoint(website, "testssl")
+
+            check_testssl_batch(websites, directory_path, debug_print, max(1, args.testssl_workers), args.testssl_timeout, grade_cache, testssl_done)
 
         # this will run after all the websites have been gone through all the checks above.
         if not (xqualys or testssl or otestssl):
             count = 10;
+            websites = [website for website in websites if "ssllabs" not in steps_done(website)]
+            started = [website for website in websites if "ssllabs_started" in steps_done(website)]
             debug_print(f"\n===============================================> starting sslchecks for:\n{websites}")
+
+            def ssllabs_checkpoint(website, step, columns):
+                if columns:
+                    website_store(website)(columns)
+                db_writer.checkpoint(website, step)
+
             while websites and count >= 0:
                 debug_print(f"\nstarting round {11 - count}")
-                results, retry = check_sslscore(websites, usecache, directory_path, debug_print)
-                for website, grade, check_score in results:
-                    update_website_checks(website, {"grade": grade, "grade_check": check_score}, db_cursor, db_connection)
+                results, retry = check_sslscore(websites, usecache, directory_path, debug_print, args.ssllabs_api, grade_cache=grade_cache,
+                                                started=started, checkpoint=ssllabs_checkpoint)
                 websites = retry
+                started = []
                 count -= 1
 
             if websites:
@@ -345,15 +607,51 @@ def main():
             else:
                 debug_print(f'\n===========Qualys SSL/TLS Configuration CHECK\nSkipped; eXclude Qualys: {xqualys}; testssl: {testssl}; only testssl: {otestssl}\n')
 
-        db_connection.commit()      # Commit to all changes and close the SQLite database
+        db_writer.close()           # Commit all changes and close the SQLite database
+        check_timing.summary(db_connection, debug_print)
         db_connection.close()
 
+        if args.history:
+            history = HistoryStore(args.history, debug_print)
+            if history.has_scan(directory_path):      # a rerun of today, the history keeps the first scan
+                debug_print(f"history: there already is a scan for {directory_path} in {args.history}, not added")
+            else:
+                history.ingest(os.path.join(directory_path, "websites.db"), directory_path, time_string, version)
+            history.close()
+        if grade_cache:
+            grade_cache.close()
+        if file_cache:
+            debug_print(file_cache.statistics())
+            file_cache.close()
+        if artifacts:
+            debug_print(artifacts.statistics())
+            artifacts.close()
+
+        debug_print(http_client.statistics())
+        if tracer:
+            tracer.close()
+        debug_print(dns_cache.statistics())
+        dns_cache.close()
+
         check_date = datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
         debug_print(f"\nALL DONE on: {check_date}\n")
     except KeyboardInterrupt:
+        if executor:
+            # the worker threads can't be killed, they stop at the next checkpoint of their website
+            aborting.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        db_writer.close()           # keep the results of the websites that are done
+        if artifacts:
+            artifacts.close()
+        if tracer:
+            tracer.close()
+        if dns_cache:
+            dns_cache.close()
         sys.exit("as you wish, aborting...")
     except OSError as e:
-        sys.exit(f"Error trying to open {myfile}: {e}")
+        sys.exit(f"Error trying to open: {e}")
+    except sqlite3.Error as e:
+        sys.exit(f"Error writing the results to the database: {e}")
 
 if __name__ == "__main__":
     main()
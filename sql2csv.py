@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 import sqlite3
 import argparse
+import csv
+import sys
+from columns import select_sql
 
 # Create argument parser
 parser = argparse.ArgumentParser(description='Output the contents of a SQLite database.')
@@ -15,19 +18,18 @@ connection = sqlite3.connect(args.database)
 # Create a cursor object
 cursor = connection.cursor()
 
-# Execute the SQL statement
-cursor.execute("SELECT * FROM website_checks")
+# Execute the SQL statement, the columns (and their order) come from columns.py
+cursor.execute(select_sql(connection))
 
-# Print the column names as a header, separated by semicolons
-print(';'.join([column[0] for column in cursor.description]))
+# Fields are separated by semicolons, fields containing a semicolon, quote or newline are quoted
+# and unknown values (NULL) are left empty
+writer = csv.writer(sys.stdout, delimiter=';', lineterminator='\n')
 
-# Fetch all rows from the result of the SQL statement
-rows = cursor.fetchall()
+# Print the column names as a header
+writer.writerow([column[0] for column in cursor.description])
 
-# Iterate through each row
-for row in rows:
-    # Print the row, with each field separated by a semicolon
-    print(';'.join([str(item) for item in row]))
+# Write the rows while they are read from the database
+writer.writerows(cursor)
 
 # Close the connection to the database
 connection.close()
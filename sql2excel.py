@@ -3,10 +3,12 @@ import sqlite3
 import argparse
 import os
 import sys
-import re
 from datetime import date
 import openpyxl
-from openpyxl.styles import Font, PatternFill
+from openpyxl.styles import Font, PatternFill, NamedStyle
+from openpyxl.cell import WriteOnlyCell
+import profiler
+from columns import COLUMNS, OK_NOT_OK, select_sql
 
 version = "v2.1d, 20240707"
 
@@ -17,6 +19,7 @@ parser = argparse.ArgumentParser(description='creates an index.html page from th
 parser.add_argument('-d','--debug', action='store_true', help='print debug messages to stderr')
 parser.add_argument('-p', '--path', type=str, help=f'The directory path, if not given will assume the directory with todays date: {dir}')
 parser.add_argument('-m', '--mail', type=str, help='e-mail address to send the Excel file to')
+parser.add_argument('--profile', action='store_true', help='profile the run, the hottest functions are written to profile-sql2excel.txt in the directory')
 parser.add_argument('-v','--version', action='store_true', help='show version info and exit')
 
 args = parser.parse_args()
@@ -40,6 +43,9 @@ if not os.path.exists(directory_path):
     print(f"The directory {directory_path} does not exist.")
     exit()
 
+if args.profile:
+    profiler.start(directory_path, "sql2excel", version=version)
+
 # Connect to the SQLite database in the directory
 try:
     database = os.path.join(directory_path, 'websites.db')
@@ -49,81 +55,49 @@ try:
 except sqlite3.Error as e:
     sys.exit(f"Error connecting to database {database}: {e}")
 
-# headers as a list, in the order they should appear in the excel sheet
-table_headers = ['website', 
-                 'https',
-                 'grade', 
-                 'grade check',
-                 'HTTPS redirect',
-                 'certificate validity',
-                 'HSTS',
-                 'headers', 
-                 'security.txt', 
-                 'robots.txt', 
-                 'version', 
-                 'error', 
-                 'remnants',
-                 'debug',
-                 'detailed log']
-
-# Query the table structure from the meta table
-c.execute("SELECT structure FROM meta")
-result = c.fetchone()
-
-if result:
-    table_structure = result[0]
-    debug and print(f"Table structure: {table_structure}")
-
-    # Extract column names from the table structure
-    column_pattern = re.compile(r'(\w+)\s+[\w\(\)]+(,)?')
-    columns = [match.group(1) for match in column_pattern.finditer(table_structure) if match.group(1) != "IF"]
-
-    # Build the SQL query
-    sql_query = "SELECT {} FROM website_checks".format(", ".join(columns))
-    debug and print(f"sql_query = {sql_query}")
-else:
-    sys.exit(f"unable to read database structure from {database}")
-
-cs = conn.cursor()
-try:
-    cs.execute(sql_query)
-    rows = cs.fetchall()
-except sqlite3.Error as error:
-    sys.exit(f"Failed to fetch data from {database}", error)
+# the columns with an excel header in columns.py, in the order they should appear in the excel sheet
+exported = [column for column in COLUMNS if column.excel]
+table_headers = [column.excel for column in exported]
+verdict_positions = {position for position, column in enumerate(exported) if column.render in OK_NOT_OK}
 
+sql_query = select_sql(conn, exported)
+debug and print(f"sql_query = {sql_query}")
 
-# Create a new workbook and worksheet
-workbook = openpyxl.Workbook()
-worksheet = workbook.active
+# Create a new workbook and worksheet, in write-only mode the rows are streamed to the file
+# so the memory use doesn't grow with the number of websites
+workbook = openpyxl.Workbook(write_only=True)
+worksheet = workbook.create_sheet()
 
-# Define cell styles for headers, OK values, and NotOK values
-header_style = Font(bold=True)
-value_ok_style = PatternFill(start_color='00FF89', end_color='00FF89', fill_type='solid')
-value_notok_style = PatternFill(start_color='FF0000', end_color='FF0000', fill_type='solid')
+# Define cell styles for headers, OK values, and NotOK values, registered once as named styles
+# so every cell refers to the same style instead of getting its own font or fill
+header_style = NamedStyle(name='header', font=Font(bold=True))
+value_ok_style = NamedStyle(name='value_ok', fill=PatternFill(start_color='00FF89', end_color='00FF89', fill_type='solid'))
+value_notok_style = NamedStyle(name='value_notok', fill=PatternFill(start_color='FF0000', end_color='FF0000', fill_type='solid'))
+for style in [header_style, value_ok_style, value_notok_style]:
+    workbook.add_named_style(style)
 
-for col, header in enumerate(table_headers):
-    worksheet.cell(row=1, column=col+1, value=header).font = header_style
+for col in range(len(table_headers)):
     worksheet.column_dimensions[openpyxl.utils.get_column_letter(col+1)].width = 15
 
-# Write the data rows with appropriate styles
-for row, data in enumerate(rows):
-    for col, value in enumerate(data):
-        debug and print(f"row = {row}, col = {col}, value = {value}")
-           
-        cell = worksheet.cell(row=row+2, column=col+1, value=value)
-
-        # col 0 = website name
-        # col 2 = grade
-        # col 5 = cert. validity (days)
-        # col 6 = hsts duration
-        # col 14 = check_date
-        if col in [1,3,4,7,8,9,10,11,12,13]:
-            if value == 1:
-                cell.fill = value_ok_style
-                cell.value = 'OK'
-            else:
-                cell.fill = value_notok_style
-                cell.value = 'NotOK'
+def styled_cell(value, style):
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.style = style
+    return cell
+
+def verdict_cell(value):
+    return styled_cell('OK', 'value_ok') if value == 1 else styled_cell('NotOK', 'value_notok')
+
+worksheet.append([styled_cell(header, 'header') for header in table_headers])
+
+# Write the data rows with appropriate styles, straight from the cursor
+cs = conn.cursor()
+try:
+    cs.execute(sql_query)
+    for data in cs:
+        debug and print(data)
+        worksheet.append([verdict_cell(value) if col in verdict_positions else value for col, value in enumerate(data)])
+except sqlite3.Error as error:
+    sys.exit(f"Failed to fetch data from {database}: {error}")
 
 # Save the excel workbook
 excelfile = os.path.join(directory_path, 'website_checks.xlsx')
@@ -4,20 +4,21 @@ import argparse
 import os
 import sys
 import datetime
-import re
 from datetime import date
+from artifact_store import ARTIFACTS_DB
+import profiler
+from columns import COLUMNS, select_sql, index_map
 
 # for this to display and work (sort) properly, sort.js and styles.css need to be in the directory above index.html
 version = "v2.1i, 20240707"
 
-html_table = ""
-
 today = date.today()
 dir = today.strftime("%Y%m%d")
 
 parser = argparse.ArgumentParser(description='creates an index.html page from the sqlite database websites.db')
 parser.add_argument('-d','--debug', action='store_true', help='print debug messages to stderr')
 parser.add_argument('-p', '--path', type=str, help=f'The directory path, if not given will assume the directory with todays date: {dir}')
+parser.add_argument('--profile', action='store_true', help='profile the run, the hottest functions are written to profile-sql2html.txt in the directory')
 parser.add_argument('-v','--version', action='store_true', help='show version info and exit')
 
 args = parser.parse_args()
@@ -41,6 +42,9 @@ if not os.path.exists(directory_path):
     print(f"The directory {directory_path} does not exist.")
     exit()
 
+if args.profile:
+    profiler.start(directory_path, "sql2html", version=version)
+
 # Connect to the SQLite database in the directory
 try:
     database = os.path.join(directory_path, 'websites.db')
@@ -50,184 +54,82 @@ try:
 except sqlite3.Error as e:
     sys.exit(f"Error connecting to database {database}: {e}")
 
-# Define the HTML table headers as a list, in the order they should appear on the webpage
-table_headers = ['website',
-                 'https',
-                 'grade',
-                 'grade<br>check',
-                 'HTTPS<br>redirect',
-                 'cert<br>validity',
-                 'HSTS<br>(days)',
-                 'headers',
-                 'security<br>.txt',
-                 'robots<br>.txt',
-                 'version',
-                 'error',
-                 'remnants',
-                 'debug',
-                 'detailed log']
-
-# Using a loop to construct the header row
-count=0
-# header_row = '<tr style="text-align: right;">'
-# for header in table_headers:
-#         header_row += f'<th onclick="sortTable({count})">{header}'
-#         header_row += '<div class="explanation">click to sort</div></th>'
-#         count += 1
-# header_row += '</tr>'
-
-
-# Query the table structure from the meta table
-c.execute("SELECT structure FROM meta")
-result = c.fetchone()
-
-if result:
-    table_structure = result[0]
-    debug and print(f"Table structure: {table_structure}")
-
-    # Extract column names from the table structure
-    column_pattern = re.compile(r'(\w+)\s+[\w\(\)]+(,)?')
-    columns = [match.group(1) for match in column_pattern.finditer(table_structure) if match.group(1) != "IF"]
-
-    # Build the SQL query
-    sql_query = "SELECT {} FROM website_checks".format(", ".join(columns))
-    debug and print(f"sql_query = {sql_query}")
-else:
-    sys.exit(f"unable to read database structure from {database}")
-
-cs = conn.cursor()
-try:
-    cs.execute(sql_query)
-    result = cs.fetchall()
-except sqlite3.Error as error:
-    sys.exit(f"Failed to fetch data from {database}", error)
-
-for row in result:
-    debug and print(row)
-    website = row[0]
-    https_check = row[1]
-    grade = row[2]
-    grad_check = row[3]
-    redirect_check = row[4]
-    cert_valid = row[5]
-    hsts = row[6]
-    security_txt = row[7]
-#    robo_check = row[9]
-    vers_check = row[8]
-    err_check  = row[9]
-    remnants = row[10]
-    debug = row[11]
-    head_check = row[12]
-    date_check = row[13]
-
-    debug and print(date_check, website, https_check, grad_check, grade, redirect_check, cert_valid, hsts, security_txt, vers_check, err_check, remnants, debug, head_check)
-
-    debugfile = f'{website}.html'
-    html_table += f'<tr><td><a class="check" href=https://{website}>{website}</a></td>'
-
-    if https_check == 1:
-        html_table += '<td class="green">&#x2705;</td>'
-    elif https_check == 0:
-        html_table += '<td class="red">&#10006;</td>'
-    else:
-        html_table += '<td class="orange"><b>&quest;</b></td>'
-
-    if grad_check == 1:
-        html_table += '<td class="green">'
-        vtgradelink = f'<a href="https://www.ssllabs.com/ssltest/analyze.html?d={website}&hideResults=on">{grade}</a>'
-    elif grad_check == 0:
-        html_table += '<td class="red">'
-        vtgradelink = f'<a href="https://www.ssllabs.com/ssltest/analyze.html?d={website}&hideResults=on">{grade}</a>'
-    else:
-        html_table += '<td class="orange">'
-        vtgradelink = '<b>&quest;</b>'
-    html_table += vtgradelink + "</td>"
-
-    if grad_check == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif grad_check == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if redirect_check == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif redirect_check == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if cert_valid is None:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-    elif cert_valid > 29:
-        html_table += f'<td class="green">{cert_valid}</td>'
-    elif cert_valid < 30:
-        html_table += f'<td class="red">{cert_valid}</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if hsts is None:
-        html_table += f'<td class="red">&#10006;</td>'
-    elif hsts >= 365:
-        html_table += f'<td class="green">{hsts}</td>'
-    else:
-        html_table += f'<td class="red">{hsts}</td>'
-
-    if security_txt == 1:
-        sectxtlink = f'<a class="check" href="https://{website}/.well-known/security.txt">&#x2705;</a>'
-        html_table += f'<td class="green">{sectxtlink}</td>'
-    elif security_txt == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    # robo_url = f'<a class="check" href="https://{website}/robots.txt">'
-    # if robo_check == 1:
-    #     html_table += f'<td class="green">{robo_url}&#x2705;</a></td>'
-    # elif robo_check == 0:
-    #     html_table += f'<td class="red">{robo_url}&#10006;</a></td>'
-    # else:
-    #     html_table += f'<td class="orange">{robo_url}<b>&quest;</b></a></td>'
-
-    if vers_check == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif vers_check == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if err_check == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif err_check == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if remnants == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif remnants == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if debug == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif debug == 0:
-        html_table += f'<td class="red">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    if head_check == 1:
-        html_table += f'<td class="green">&#x2705;</td>'
-    elif head_check == 0:
-        html_table += f'<td class="black">&#10006;</td>'
-    else:
-        html_table += f'<td class="orange"><b>&quest;</b></td>'
-
-    html_table += f'<td><a class="check" href={debugfile}>{date_check}</td></tr>\n'
-
-# Close the connection to the database
-conn.close()
+###########################################################################################################
+# renderers, one per column of the overview (the columns in columns.py with an html header)
+# each renderer is built once and turns a database row into the <td> of its column, so a row is rendered
+# with a single join and the table is written to index.html while the rows come in from the cursor
+###########################################################################################################
+shown = [column for column in COLUMNS if column.html]
+sql_query = select_sql(conn)
+debug and print(f"sql_query = {sql_query}")
+index = index_map()
+
+OK = '<td class="green">&#x2705;</td>'
+NOT_OK = '<td class="red">&#10006;</td>'
+UNKNOWN = '<td class="orange"><b>&quest;</b></td>'
+
+def verdict(column, not_ok=NOT_OK):
+    """
+    1 is a green check mark, 0 a red cross and anything else a question mark.
+    """
+    i = index[column]
+    cells = {1: OK, 0: not_ok}
+    return lambda row: cells.get(row[i], UNKNOWN)
+
+def website_cell(column):
+    i = index[column]
+    return lambda row: f'<td><a class="check" href=https://{row[i]}>{row[i]}</a></td>'
+
+def grade_cell(column):
+    i, check, site = index[column], index["grade_check"], index["websites"]
+    def render(row):
+        if row[check] == 1 or row[check] == 0:
+            color = "green" if row[check] == 1 else "red"
+            return f'<td class="{color}"><a href="https://www.ssllabs.com/ssltest/analyze.html?d={row[site]}&hideResults=on">{row[i]}</a></td>'
+        return UNKNOWN
+    return render
+
+def days_cell(column):
+    i = index[column]
+    def render(row):
+        if row[i] is None:
+            return UNKNOWN
+        return f'<td class="{"green" if row[i] > 29 else "red"}">{row[i]}</td>'
+    return render
+
+def hsts_cell(column):
+    i = index[column]
+    def render(row):
+        if row[i] is None:
+            return NOT_OK
+        return f'<td class="{"green" if row[i] >= 365 else "red"}">{row[i]}</td>'
+    return render
+
+def security_txt_cell(column):
+    i, site = index[column], index["websites"]
+    def render(row):
+        if row[i] == 1:
+            return f'<td class="green"><a class="check" href="https://{row[site]}/.well-known/security.txt">&#x2705;</a></td>'
+        return NOT_OK if row[i] == 0 else UNKNOWN
+    return render
+
+def check_date_cell(column):
+    i, site = index[column], index["websites"]
+    return lambda row: f'<td><a class="check" href={row[site]}.html>{row[i]}</td>'
+
+def value_cell(column):
+    i = index[column]
+    return lambda row: f'<td>{"" if row[i] is None else row[i]}</td>'
+
+RENDERERS = {"website": website_cell, "verdict": verdict, "verdict_black": lambda column: verdict(column, '<td class="black">&#10006;</td>'),
+             "grade": grade_cell, "days": days_cell, "hsts": hsts_cell, "security_txt": security_txt_cell,
+             "check_date": check_date_cell, "value": value_cell}
+renderers = [RENDERERS[column.render](column.name) for column in shown]
+
+def render_rows(cursor):
+    for row in cursor:
+        debug and print(row)
+        yield "<tr>" + "".join([render(row) for render in renderers]) + "</tr>\n"
 
 with open('styles.css', 'r') as f:
     css_styles = f.read()
@@ -235,8 +137,8 @@ with open('styles.css', 'r') as f:
 with open('sort.js', 'r') as f:
     sort_js = f.read()
 
-# Create the complete HTML page, the {} below will be replaced with the content of the variables at the end
-html_page = """
+# The complete HTML page, the rows of the table are written between html_head and html_tail
+html_head = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -248,24 +150,14 @@ html_page = """
   <table border="1" class="dataframe mystyle" id="myTable">
   <thead>
     <tr style="text-align: right;">
-    <th onclick="sortTable(0)">website<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(1)">https<div class="explanation">click to sort</div></th>
-    <th onclick="sortGrades(2)">grade<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(3)">grade<br>check<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(4)">HTTPS<br>redirect<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(5)">cert<br>validity<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(6)">HSTS<br>(days)<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(7)">security<br>.txt<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(8)">version<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(9)">error<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(10)">remnants<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(11)">debug<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(12)">headers<div class="explanation">click to sort</div></th>
-    <th onclick="sortTable(13)">detailed log<div class="explanation">click to sort</div></th>
+    {}
     </tr>
   </thead>
   <tbody>
-    {}
+    """.format("\n    ".join(f'<th onclick="{"sortGrades" if column.render == "grade" else "sortTable"}({position})">{column.html}<div class="explanation">click to sort</div></th>'
+                            for position, column in enumerate(shown)))
+
+html_tail = """
   </tbody>
   </table>
   <br />
@@ -278,13 +170,26 @@ html_page = """
   Click here for a: <a href="debug.log">debug.log</a> unless scirtscan was run with --no_debugfile<br />
 </body>
 </html>
-""".format(html_table)
+"""
 
 myindex = directory_path + "/" + "index.html"
+# written to a temporary file first, so a webserver never serves a half written index.html
 try:
-    with open(myindex, 'w') as f:
-        f.write(html_page)
+    with open(myindex + ".tmp", 'w') as f:
+        f.write(html_head)
+        cs = conn.cursor()
+        cs.execute(sql_query)
+        f.writelines(render_rows(cs))
+        f.write(html_tail)
+    os.replace(myindex + ".tmp", myindex)
+except sqlite3.Error as error:
+    sys.exit(f"Failed to fetch data from {database}: {error}")
 except OSError as error:
     print(error)
 
+# Close the connection to the database
+conn.close()
+
 print(f"HTML table written to {myindex}")
+if os.path.exists(os.path.join(directory_path, ARTIFACTS_DB)):
+    print(f"the detailed logs are in {ARTIFACTS_DB}, to follow the links serve the directory with: ./artifact_store.py {directory_path} --serve 8000")
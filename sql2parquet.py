@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+###########################################################################################################
+# exports website_checks of one or more daily databases to a Parquet dataset for analytics
+# the dataset is a directory with one file per scan date (YYYYMMDD.parquet) for the current month and one file
+# per month (YYYYMM.parquet) for the months before, every row has the scan_date (YYYYMMDD) it came from.
+# A scan date that is already in the dataset is skipped, so a daily run only writes the new scan, and a year
+# of history is about twelve files that load in one go:
+#   ./sql2parquet.py results.parquet 2024*/websites.db
+# The columns are typed from columns.py: verdicts are int8 (1 OK, 0 not OK, null unknown), the grade is
+# dictionary encoded and check_date is a timestamp. In a notebook the whole history is loaded with:
+#   sql2parquet.load("results.parquet")   or   pyarrow.parquet.read_table("results.parquet", schema=sql2parquet.DATASET_SCHEMA)
+# with the schema files written before a column was added to columns.py get that column as nulls.
+# needs pyarrow: pip3 install -r requirements_sql2parquet.txt
+# 20241018
+###########################################################################################################
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+from columns import COLUMNS, select_sql
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    sys.exit("sql2parquet.py needs pyarrow: pip3 install -r requirements_sql2parquet.txt")
+
+BATCH_SIZE = 65536      # rows per record batch, the memory use doesn't grow with the size of a scan
+
+# the Arrow type of a column, by how the column is rendered
+TYPES = {"verdict": pa.int8(), "verdict_black": pa.int8(), "security_txt": pa.int8(), "days": pa.int32(), "hsts": pa.int32(),
+         "grade": pa.dictionary(pa.int8(), pa.string()), "website": pa.string(), "check_date": pa.timestamp("s"), "value": pa.float64()}
+
+SCHEMA = pa.schema([pa.field(column.name, TYPES[column.render]) for column in COLUMNS])
+DATASET_SCHEMA = SCHEMA.append(pa.field("scan_date", pa.dictionary(pa.int32(), pa.string())))
+
+def check_date(value):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d_%H:%M:%S")
+    except (TypeError, ValueError):
+        return None
+
+def record_batches(conn):
+    """
+    Yields the website_checks rows of a daily database as record batches with SCHEMA.
+    """
+    cursor = conn.execute(select_sql(conn))
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return
+        arrays = []
+        for position, column in enumerate(COLUMNS):
+            values = [row[position] for row in rows]
+            if column.render == "check_date":
+                values = [check_date(value) for value in values]
+            if column.render == "grade":
+                arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(SCHEMA.field(column.name).type))
+            else:
+                arrays.append(pa.array(values, SCHEMA.field(column.name).type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+def read_file(path):
+    """
+    Reads a file of the dataset with DATASET_SCHEMA, columns added to columns.py after the file was written are null.
+    """
+    table = pq.read_table(path)
+    for field in DATASET_SCHEMA:
+        if field.name not in table.column_names:
+            table = table.append_column(field, pa.nulls(table.num_rows, field.type))
+    return table.select(DATASET_SCHEMA.names).cast(DATASET_SCHEMA)
+
+def load(dataset):
+    """
+    Returns the whole dataset as one table, older files get the columns they don't have as nulls.
+    """
+    return pq.read_table(dataset, schema=DATASET_SCHEMA)
+
+def scan_dates(path):
+    return set(pq.read_table(path, columns=["scan_date"]).column("scan_date").combine_chunks().dictionary_decode().unique().to_pylist())
+
+def write_file(table_or_batches, path):
+    """
+    Writes next to the file and renames when complete, so a reader never sees half a file
+    (readers skip files starting with a dot).
+    """
+    temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    with pq.ParquetWriter(temporary, DATASET_SCHEMA, compression="zstd") as writer:
+        if isinstance(table_or_batches, pa.Table):
+            writer.write_table(table_or_batches)
+        else:
+            for batch in table_or_batches:
+                writer.write_batch(batch)
+    os.replace(temporary, path)
+
+def compact(dataset, before, logger=print):
+    """
+    Merges the day files of the months before `before` (YYYYMM) into the file of their month.
+    A month is merged once, when the first scan of a later month is exported.
+    """
+    months = {}
+    for name in sorted(os.listdir(dataset)):
+        if len(name) == len("YYYYMMDD.parquet") and name.endswith(".parquet") and name[:6] < before:
+            months.setdefault(name[:6], []).append(os.path.join(dataset, name))
+    for month, day_files in months.items():
+        month_file = os.path.join(dataset, f"{month}.parquet")
+        tables = [read_file(month_file)] if os.path.exists(month_file) else []
+        in_month = scan_dates(month_file) if tables else set()
+        # a day file that is already in the month file is left over from an interrupted compaction
+        tables += [read_file(path) for path in day_files if os.path.basename(path)[:8] not in in_month]
+        write_file(pa.concat_tables(tables).unify_dictionaries(), month_file)
+        for path in day_files:
+            os.remove(path)
+        logger(f"{len(day_files)} days of {month} merged into {month_file}")
+
+def export(db_path, dataset, scan_date=None, force=False, logger=print):
+    """
+    Adds the website_checks rows of a daily database to the dataset, as a file of its own (YYYYMMDD.parquet).
+    The day files of earlier months are merged into one file per month (YYYYMM.parquet), so adding a scan
+    only writes that scan and a year of history is twelve files that load in one go.
+
+    Args:
+    db_path (str): The daily database (YYYYMMDD/websites.db).
+    dataset (str): The directory with the Parquet dataset.
+    scan_date (str): YYYYMMDD, defaults to the name of the directory of the database.
+    force (bool): Replace the rows of the scan date if it is already in the dataset.
+    logger (function pointer): Function to print debug information.
+
+    Returns:
+    int: number of rows written, None if the scan date was skipped.
+    """
+    scan_date = scan_date or os.path.basename(os.path.dirname(os.path.abspath(db_path)))
+    day_file = os.path.join(dataset, f"{scan_date}.parquet")
+    month_file = os.path.join(dataset, f"{scan_date[:6]}.parquet")
+    os.makedirs(dataset, exist_ok=True)
+
+    in_month = os.path.exists(month_file) and scan_date in scan_dates(month_file)
+    if (in_month or os.path.exists(day_file)) and not force:
+        logger(f"skipping {db_path}, {scan_date} is already in {dataset}")
+        return None
+    if in_month:
+        # only when a scan of a merged month is exported again
+        previous = read_file(month_file)
+        write_file(previous.filter(pc.not_equal(previous.column("scan_date").combine_chunks().dictionary_decode(), scan_date)), month_file)
+
+    count = 0
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        def batches():
+            nonlocal count
+            for batch in record_batches(conn):
+                scan_dates = pa.DictionaryArray.from_arrays(pa.array([0] * batch.num_rows, pa.int32()), pa.array([scan_date]))
+                count += batch.num_rows
+                yield pa.RecordBatch.from_arrays(batch.columns + [scan_dates], schema=DATASET_SCHEMA)
+        write_file(batches(), day_file)
+    finally:
+        conn.close()
+    logger(f"{db_path}: {count} websites written to {day_file}")
+
+    compact(dataset, scan_date[:6], logger)
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='export the website_checks of daily websites.db files to a Parquet dataset, with a file per scan date that is merged into a file per month')
+    parser.add_argument('dataset', help='the directory with the Parquet dataset (created if it does not exist)')
+    parser.add_argument('databases', nargs='+', help='daily databases to export, e.g. 2024*/websites.db')
+    parser.add_argument('-f', '--force', action='store_true', help='also export a database if its scan date is already in the dataset')
+    args = parser.parse_args()
+
+    for db_path in sorted(args.databases):
+        try:
+            export(db_path, args.dataset, force=args.force)
+        except (sqlite3.Error, pa.ArrowException) as e:
+            print(f"failed to export {db_path}: {e}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
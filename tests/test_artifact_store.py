@@ -0,0 +1,21 @@
+import artifact_store
+
+
+def test_flush_stores_the_contents_so_far(tmp_path):
+    store = artifact_store.ArtifactStore(str(tmp_path / "artifacts.db"))
+    store.write("a.test.html", "old\n")
+    outfile = store.open("a.test.html", "w")
+    outfile.write("first\n")
+    outfile.flush()
+    assert store.read("a.test.html") == b"first\n"
+    assert outfile.getvalue() == ""
+    outfile.write("second\n")
+    outfile.close()
+    assert store.read("a.test.html") == b"first\nsecond\n"
+
+    with store.open("a.test.html", "a") as outfile:
+        outfile.write("third\n")
+        outfile.flush()
+        outfile.flush()
+    assert store.read("a.test.html") == b"first\nsecond\nthird\n"
+    store.close()
@@ -0,0 +1,26 @@
+import asyncio
+import io
+from check_dns import check_dns
+
+
+def records(status="ok", **values):
+    result = {"status": status, "error": None}
+    result.update({rdtype: values.get(rdtype, []) for rdtype in ["A", "AAAA", "CNAME", "MX", "TXT"]})
+    return result
+
+
+def test_resolved_website_passes():
+    outfile = io.StringIO()
+    assert check_dns("a.test", outfile, lambda msg: None, records(A=["192.0.2.1"]))
+    assert "192.0.2.1" in outfile.getvalue()
+
+
+def test_nxdomain_fails():
+    assert not check_dns("a.test", io.StringIO(), lambda msg: None, records("NXDOMAIN"))
+
+
+def test_called_from_a_running_loop():
+    # scan_website calls check_dns from a coroutine, it must not start an event loop of its own
+    async def scan():
+        return check_dns("a.test", io.StringIO(), lambda msg: None, records("SERVFAIL"))
+    assert asyncio.run(scan()) is False
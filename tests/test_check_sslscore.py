@@ -0,0 +1,127 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import pytest
+import check_sslscore
+
+
+class StandIn:
+    """
+    A local stand-in of the SSL Labs API: an assessment is READY after `polls` polls, at most
+    max_assessments run at the same time and `overloaded` analyze requests are answered with a 529 first.
+    """
+
+    def __init__(self, max_assessments=2, polls=2, overloaded=0):
+        self.max_assessments = max_assessments
+        self.polls = polls
+        self.overloaded = overloaded
+        self.running = {}       # host -> polls left
+        self.most_running = 0
+        self.started = []
+
+    def analyze(self, host, new):
+        if self.overloaded:
+            self.overloaded -= 1
+            return 529, {}
+        if new:
+            if len(self.running) >= self.max_assessments:
+                return 429, {}
+            self.running[host] = self.polls
+            self.started.append(host)
+            self.most_running = max(self.most_running, len(self.running))
+            return 200, {"status": "DNS"}
+        self.running[host] -= 1
+        if self.running[host] > 0:
+            return 200, {"status": "IN_PROGRESS"}
+        del self.running[host]
+        return 200, {"status": "READY", "endpoints": [{"ipAddress": "192.0.2.1", "grade": "A+"}]}
+
+
+@pytest.fixture
+def api():
+    stand_in = StandIn()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            query = parse_qs(parts.query)
+            if parts.path.endswith("/info"):
+                status, body = 200, {"maxAssessments": stand_in.max_assessments, "currentAssessments": 0, "newAssessmentCoolOff": 1000}
+            else:
+                status, body = stand_in.analyze(query["host"][0], "startNew" in query or "fromCache" in query)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("X-Max-Assessments", str(stand_in.max_assessments))
+            self.send_header("X-Current-Assessments", str(len(stand_in.running)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stand_in.url = f"http://127.0.0.1:{server.server_address[1]}/api/v3"
+    yield stand_in
+    server.shutdown()
+    server.server_close()
+
+
+class FakeClock:
+    """
+    sleep() moves the clock forward instead of waiting.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def run(api, websites, tmp_path):
+    fake = FakeClock()
+    results, retry = check_sslscore.check_sslscore(websites, False, str(tmp_path), lambda msg: None, api.url,
+                                                   sleep=fake.sleep, clock=fake.clock)
+    return results, retry, fake
+
+
+def test_assessments_are_pipelined_within_the_limit(api, tmp_path):
+    websites = ["a.test", "b.test", "c.test", "d.test", "e.test"]
+    results, retry, fake = run(api, websites, tmp_path)
+
+    assert sorted(website for website, grade, check_score in results) == websites
+    assert retry == []
+    assert api.most_running == api.max_assessments
+    assert api.started == websites
+    # cool-off pauses between new assessments and poll waits, no busy loop
+    assert len(fake.sleeps) < 40
+    assert all(seconds >= 0 for seconds in fake.sleeps)
+
+
+def test_overload_pauses_all_requests(api, tmp_path):
+    api.overloaded = 1
+    results, retry, fake = run(api, ["a.test", "b.test"], tmp_path)
+
+    assert sorted(website for website, grade, check_score in results) == ["a.test", "b.test"]
+    assert check_sslscore.OVERLOAD_WAIT in fake.sleeps
+    assert fake.now - 1000.0 >= check_sslscore.OVERLOAD_WAIT
+    assert len(fake.sleeps) < 40
+
+
+def test_gives_up_after_max_retries(api, tmp_path):
+    api.overloaded = check_sslscore.MAX_RETRIES
+    results, retry, fake = run(api, ["a.test"], tmp_path)
+
+    assert results == []
+    assert retry == ["a.test"]
+    assert fake.sleeps.count(check_sslscore.OVERLOAD_WAIT) == check_sslscore.MAX_RETRIES - 1
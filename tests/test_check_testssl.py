@@ -0,0 +1,30 @@
+import time
+import check_testssl
+
+
+def test_timeout_kills_the_children_of_testssl(tmp_path, monkeypatch):
+    # a stand-in testssl.sh that starts a child (like its openssl calls) and hangs
+    pidfile = tmp_path / "child.pid"
+    script = tmp_path / "testssl.sh"
+    script.write_text(f"#!/bin/sh\nsleep 60 &\necho $! > {pidfile}\nwait\n")
+    script.chmod(0o755)
+    monkeypatch.setattr(check_testssl, "testssl_path", str(script))
+
+    grade, findings, runtime = check_testssl.run_testssl("a.test", str(tmp_path), lambda msg: None, timeout=1)
+    assert grade is None
+    child = int(pidfile.read_text())
+    # the child is killed with the process group, at most a zombie until its parent is reaped
+    assert not running(child)
+
+
+def running(pid, wait=5):
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        try:
+            with open(f"/proc/{pid}/stat") as stat:
+                if stat.read().split()[2] in "ZX":
+                    return False
+        except FileNotFoundError:
+            return False
+        time.sleep(0.05)
+    return True
@@ -0,0 +1,62 @@
+import io
+import sqlite3
+import check_testssl
+import check_timing
+
+
+class FakeGradeCache:
+    def identity(self, website):
+        return "192.0.2.1"
+
+    def lookup(self, website, source, identity, logger=None):
+        return "A+", 1
+
+    def store(self, website, source, identity, grade, check_score):
+        raise AssertionError("a cached grade is not stored again")
+
+
+def collect():
+    stored = []
+    return stored, lambda columns, table: stored.append((table, columns))
+
+
+def test_testssl_grade_cache_hit_is_recorded_as_cached(tmp_path, monkeypatch):
+    testssl = tmp_path / "testssl.sh"
+    testssl.write_text("")
+    monkeypatch.setattr(check_testssl, "testssl_path", str(testssl))
+
+    grade, check_score, runtime = check_testssl.check_testssl("a.test", io.StringIO(), lambda msg: None, FakeGradeCache())
+    assert (grade, check_score, runtime) == ("A+", 1, None)
+
+    stored, store = collect()
+    check_timing.record_testssl(store, grade, runtime, timeout=60)
+    table, columns = stored[0]
+    assert table == "check_timings"
+    assert columns["outcome"] == "cached" and columns["seconds"] == 0
+
+
+def test_testssl_missing_is_recorded_as_error(monkeypatch):
+    monkeypatch.setattr(check_testssl, "testssl_path", "/nonexistent/testssl.sh")
+    grade, check_score, runtime = check_testssl.check_testssl("a.test", io.StringIO(), lambda msg: None)
+
+    stored, store = collect()
+    check_timing.record_testssl(store, grade, runtime, timeout=60)
+    assert stored[0][1]["outcome"] == "error"
+
+
+def test_testssl_outcomes():
+    stored, store = collect()
+    check_timing.record_testssl(store, "A", 12.5, timeout=60)
+    check_timing.record_testssl(store, "Z", 60, timeout=60)
+    check_timing.record_testssl(store, "Z", 3.0, timeout=60)
+    assert [columns["outcome"] for table, columns in stored] == ["ok", "timeout", "error"]
+
+
+def test_summary_leaves_out_cached():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE check_timings (websites TEXT, check_name TEXT, started TEXT, seconds REAL, outcome TEXT, error TEXT)")
+    conn.executemany("INSERT INTO check_timings VALUES (?, 'testssl', '', ?, ?, NULL)",
+                     [("a.test", 30.0, "ok"), ("b.test", 0, "cached"), ("c.test", 0, "cached")])
+    lines = []
+    check_timing.summary(conn, lines.append)
+    assert any(line.startswith("testssl") and " 1 " in line and "30.00" in line for line in lines)
@@ -0,0 +1,34 @@
+import sqlite3
+import pytest
+from db_writer import DBWriter
+
+
+def database(tmp_path):
+    path = str(tmp_path / "websites.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE website_checks (websites TEXT PRIMARY KEY, grade TEXT)")
+    conn.execute("CREATE TABLE checkpoints (websites TEXT, step TEXT, done_at TEXT, PRIMARY KEY (websites, step))")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_failed_batch_is_raised_by_flush_and_close(tmp_path):
+    writer = DBWriter(database(tmp_path), lambda msg: None)
+    writer.put("a.test", {"no_such_column": 1})
+    with pytest.raises(sqlite3.OperationalError):
+        writer.flush()
+    writer.put("b.test", {"grade": "A"})        # the writer goes on with the next batch
+    with pytest.raises(sqlite3.OperationalError):
+        writer.close()
+    conn = sqlite3.connect(str(tmp_path / "websites.db"))
+    assert conn.execute("SELECT websites, grade FROM website_checks").fetchall() == [("b.test", "A")]
+
+
+def test_stopped_writer_releases_flush(tmp_path):
+    writer = DBWriter(database(tmp_path), lambda msg: None)
+    writer.queue.put(("put", "website_checks"))     # the writer thread stops on an item it can't handle
+    with pytest.raises(ValueError):
+        writer.flush()
+    with pytest.raises(ValueError):
+        writer.close()
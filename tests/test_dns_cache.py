@@ -0,0 +1,40 @@
+import dns.exception
+import dns.resolver
+import dns_cache
+from dns_cache import DNSCache
+
+
+class FakeResolver:
+    def __init__(self, error):
+        self.error = error
+        self.queries = 0
+
+    def resolve(self, name, rdtype, lifetime=None):
+        self.queries += 1
+        raise self.error
+
+
+def cache_with(monkeypatch, error):
+    cache = DNSCache(logger=lambda msg: None)
+    cache.resolver = FakeResolver(error)
+    system = []
+    monkeypatch.setattr(dns_cache, "_system_getaddrinfo", lambda host, *args: system.append(host) or [])
+    return cache, system
+
+
+def test_timeout_falls_back_for_one_lookup(monkeypatch):
+    cache, system = cache_with(monkeypatch, dns.exception.Timeout())
+    cache.getaddrinfo("a.test", 443)
+    cache.getaddrinfo("a.test", 443)
+    assert "a.test" not in cache.system_names
+    assert cache.resolver.queries == 2         # the second lookup tries DNS again
+    assert system == ["a.test", "a.test"]
+
+
+def test_unknown_name_goes_to_the_system_resolver(monkeypatch):
+    cache, system = cache_with(monkeypatch, dns.resolver.NXDOMAIN())
+    cache.getaddrinfo("printer.local", 80)
+    cache.getaddrinfo("printer.local", 80)
+    assert "printer.local" in cache.system_names
+    assert cache.resolver.queries == 1
+    assert system == ["printer.local", "printer.local"]
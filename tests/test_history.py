@@ -0,0 +1,51 @@
+import os
+import sqlite3
+import columns
+import history
+from columns import COLUMNS, Column
+from history import HistoryStore
+
+
+def daily_database(directory):
+    os.makedirs(directory)
+    path = os.path.join(directory, "websites.db")
+    conn = sqlite3.connect(path)
+    conn.execute(columns.create_table_sql())
+    conn.execute("CREATE TABLE meta (structure TEXT, version TEXT)")
+    conn.execute("INSERT INTO meta (version) VALUES ('v3.0')")
+    conn.execute("INSERT INTO website_checks (websites, grade, grade_check) VALUES ('a.test', 'A+', 1)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_new_column_is_added_to_an_existing_history(tmp_path, monkeypatch):
+    history_path = str(tmp_path / "history.db")
+    HistoryStore(history_path, lambda msg: None).close()
+
+    # a check added to columns.py after the history was created
+    added = COLUMNS + [Column("new_check", "INT", "a new check", "new", "new", "verdict")]
+    monkeypatch.setattr(columns, "COLUMNS", added)
+    monkeypatch.setattr(columns, "RESULT_COLUMNS", added[1:])
+    monkeypatch.setattr(history, "RESULT_COLUMNS", added[1:])
+    monkeypatch.setattr(history, "VERDICT_COLUMNS", columns.VERDICT_COLUMNS + ["new_check"])
+
+    db_path = daily_database(str(tmp_path / "20241018"))
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE website_checks SET new_check = 1")
+    conn.commit()
+    conn.close()
+
+    store = HistoryStore(history_path, lambda msg: None)
+    store.ingest(db_path)
+    assert store.conn.execute("SELECT website, new_check FROM results").fetchall() == [("a.test", 1)]
+    store.close()
+
+
+def test_has_scan(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), lambda msg: None)
+    assert not store.has_scan("20241018")
+    store.ingest(daily_database(str(tmp_path / "20241018")))
+    assert store.has_scan("20241018")
+    assert store.website_history("a.test")[0][:3] == ("20241018", "A+", 1)
+    store.close()
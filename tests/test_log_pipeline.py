@@ -0,0 +1,43 @@
+import asyncio
+import json
+from log_pipeline import LogPipeline, set_site
+
+
+def scan(log, website):
+    async def check():
+        set_site(website)
+        log.log("in the check")
+        await asyncio.to_thread(log.log, "in a helper thread")
+    asyncio.run(check())
+
+
+def test_text_lines_have_the_site_tag(tmp_path):
+    path = tmp_path / "debug.log"
+    log = LogPipeline(str(path))
+    log.log("starting")
+    scan(log, "a.test")
+    log.log("done")
+    log.log("given", site="b.test")
+    log.close()
+    assert path.read_text().splitlines() == ["starting", "[a.test] in the check", "[a.test] in a helper thread", "done", "[b.test] given"]
+
+
+def test_json_lines_have_the_site(tmp_path):
+    path = tmp_path / "debug.log"
+    log = LogPipeline(str(path), json_lines=True)
+    scan(log, "a.test")
+    log.log("done")
+    log.close()
+    assert [(line["site"], line["msg"]) for line in map(json.loads, path.read_text().splitlines())] == \
+        [("a.test", "in the check"), ("a.test", "in a helper thread"), ("-", "done")]
+
+
+
+def test_testssl_jobs_are_tagged(tmp_path, monkeypatch):
+    import check_testssl
+    path = tmp_path / "debug.log"
+    log = LogPipeline(str(path))
+    monkeypatch.setattr(check_testssl, "testssl_path", "/nonexistent/testssl.sh")
+    check_testssl.check_testssl_batch(["a.test", "b.test"], str(tmp_path), log.log, workers=2)
+    log.close()
+    assert sorted(path.read_text().splitlines()) == ["[a.test] === testssl.sh", "[b.test] === testssl.sh"]
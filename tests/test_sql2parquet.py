@@ -0,0 +1,59 @@
+import os
+import sqlite3
+import pytest
+from columns import create_table_sql
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+import sql2parquet
+
+
+def daily_database(root, scan_date, websites):
+    directory = os.path.join(root, scan_date)
+    os.makedirs(directory)
+    path = os.path.join(directory, "websites.db")
+    conn = sqlite3.connect(path)
+    conn.execute(create_table_sql())
+    conn.executemany("INSERT INTO website_checks (websites, grade, https_reachable, check_date) VALUES (?, 'A', 1, '2024-01-31_10:00:00')",
+                     [(website,) for website in websites])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def quiet(msg):
+    pass
+
+
+def test_days_are_appended_and_merged_per_month(tmp_path):
+    dataset = str(tmp_path / "results.parquet")
+    for scan_date in ["20240130", "20240131", "20240201"]:
+        assert sql2parquet.export(daily_database(str(tmp_path), scan_date, ["a.test", "b.test"]), dataset, logger=quiet) == 2
+
+    assert sorted(os.listdir(dataset)) == ["202401.parquet", "20240201.parquet"]
+    table = sql2parquet.load(dataset)
+    assert table.num_rows == 6
+    assert sorted(set(table.column("scan_date").to_pylist())) == ["20240130", "20240131", "20240201"]
+
+
+def test_scan_date_already_in_the_dataset(tmp_path):
+    dataset = str(tmp_path / "results.parquet")
+    db_path = daily_database(str(tmp_path), "20240130", ["a.test"])
+    sql2parquet.export(db_path, dataset, logger=quiet)
+    sql2parquet.export(daily_database(str(tmp_path), "20240201", ["a.test"]), dataset, logger=quiet)
+
+    assert sql2parquet.export(db_path, dataset, logger=quiet) is None
+    assert sql2parquet.export(db_path, dataset, force=True, logger=quiet) == 1
+    assert sql2parquet.load(dataset).num_rows == 2
+
+
+def test_file_without_a_new_column(tmp_path):
+    # written before testssl_runtime was added to columns.py
+    path = str(tmp_path / "202401.parquet")
+    old_schema = pa.schema([field for field in sql2parquet.DATASET_SCHEMA if field.name != "testssl_runtime"])
+    pq.write_table(pa.table({"websites": ["a.test"], "scan_date": ["20240130"]}).cast(
+        pa.schema([old_schema.field("websites"), old_schema.field("scan_date")])), path)
+
+    table = sql2parquet.read_file(path)
+    assert table.schema == sql2parquet.DATASET_SCHEMA
+    assert table.column("testssl_runtime").to_pylist() == [None]
@@ -0,0 +1,221 @@
+###########################################################################################################
+# request-phase tracing (scirtscan.py --trace)
+# records spans per website: site -> check -> request -> phase (dns, connect, tls, ttfb), and writes them to
+# trace.json in the date directory in the Chrome trace event format, one event per line. The file can be
+# opened in chrome://tracing or https://ui.perfetto.dev, every website is a row (a "thread") there.
+# The phases are measured by wrapping the layers the checks use: socket.getaddrinfo (dns), the urllib3
+# connections of requests (connect, tls, ttfb), the trace hooks of aiohttp in async mode (dns, connect
+# including tls, ttfb) and the TLS connection of check_ssl_certificate_validity (connect, tls).
+# Without --trace nothing is wrapped and span() returns a shared no-op context manager.
+# 20241018
+###########################################################################################################
+import contextlib
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+import urllib3.connection
+
+_tracer = None          # the installed Tracer, None means tracing is off
+_lane = contextvars.ContextVar("tracing_lane", default=0)   # row in the trace viewer, one per website
+_NO_SPAN = contextlib.nullcontext()
+_connected = threading.local()      # when the TCP connection of the current urllib3 connect() was done
+
+FILE_BUFFER = 64 * 1024
+
+class Tracer:
+    """
+    Args:
+    path (str): The trace file (trace.json in the date directory).
+    logger (function pointer): Function to print debug information.
+    """
+
+    def __init__(self, path, logger):
+        self.path = path
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.lanes = {}
+        self.events = 0
+        self.start = time.perf_counter()
+        self.pid = os.getpid()
+        self.file = open(path, "w", buffering=FILE_BUFFER)
+        # JSON array format: the viewers accept a trailing comma and a missing ], so every event is one line
+        self.file.write("[\n")
+        self.name_lane(0, "scirtscan")
+        self.patched = []
+
+    def write(self, event):
+        line = json.dumps(event) + ",\n"
+        with self.lock:
+            self.file.write(line)
+            self.events += 1
+
+    def name_lane(self, lane, name):
+        self.write({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": lane, "args": {"name": name}})
+
+    def lane(self, website):
+        with self.lock:
+            if website not in self.lanes:
+                self.lanes[website] = len(self.lanes) + 1
+                new = True
+            else:
+                new = False
+        if new:
+            self.name_lane(self.lanes[website], website)
+        return self.lanes[website]
+
+    def complete(self, name, cat, start, end, args=None, lane=None):
+        """
+        Writes a span from start to end (time.perf_counter() values).
+        """
+        event = {"name": name, "cat": cat, "ph": "X", "pid": self.pid, "tid": _lane.get() if lane is None else lane,
+                 "ts": round((start - self.start) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+        if args:
+            event["args"] = args
+        self.write(event)
+
+    def install(self):
+        """
+        Wraps the DNS lookups and the urllib3 connections and makes span() record.
+        """
+        global _tracer
+        _tracer = self
+        self.patch(socket, "getaddrinfo", traced_getaddrinfo)
+        self.patch(urllib3.connection.HTTPConnection, "_new_conn", traced_new_conn)
+        self.patch(urllib3.connection.HTTPSConnection, "connect", traced_https_connect)
+        self.patch(urllib3.connection.HTTPConnection, "getresponse", traced_getresponse)
+
+    def patch(self, owner, name, wrapper):
+        original = getattr(owner, name)
+        self.patched.append((owner, name, original))
+        setattr(owner, name, wrapper(original))
+
+    def close(self):
+        global _tracer
+        if _tracer is self:
+            _tracer = None
+        for owner, name, original in reversed(self.patched):
+            setattr(owner, name, original)
+        self.patched = []
+        with self.lock:
+            self.file.close()
+        self.logger(f"trace: {self.events} events written to {self.path}")
+
+class Span:
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        tracer = _tracer
+        if tracer is not None:
+            if exc is not None:
+                self.args = dict(self.args, error=f"{exc_type.__name__}: {exc}")
+            tracer.complete(self.name, self.cat, self.start, time.perf_counter(), self.args)
+        return False
+
+class SiteSpan(Span):
+    """
+    Span of a website, the spans inside it end up in the row of the website.
+    """
+
+    def __enter__(self):
+        self.token = _lane.set(_tracer.lane(self.name))
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        super().__exit__(exc_type, exc, tb)
+        _lane.reset(self.token)
+        return False
+
+def span(name, cat, **args):
+    """
+    Returns a context manager that records a span, or a no-op one when tracing is off.
+
+    Args:
+    name (str): The name of the span (the check, the request).
+    cat (str): The category: site, check, request or phase.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return Span(name, cat, args)
+
+def site(website):
+    """
+    Returns the context manager for the span of a website.
+    """
+    if _tracer is None:
+        return _NO_SPAN
+    return SiteSpan(website, "site", {})
+
+def enabled():
+    return _tracer is not None
+
+###########################################################################################################
+# wrappers, only installed with --trace
+###########################################################################################################
+def traced_getaddrinfo(original):
+    def getaddrinfo(host, *args, **kwargs):
+        with span("dns", "phase", host=str(host)):
+            return original(host, *args, **kwargs)
+    return getaddrinfo
+
+def traced_new_conn(original):
+    def _new_conn(self):
+        with span("connect", "phase", host=self.host, port=self.port):
+            sock = original(self)
+        _connected.at = time.perf_counter()
+        return sock
+    return _new_conn
+
+def traced_https_connect(original):
+    def connect(self):
+        _connected.at = None
+        try:
+            return original(self)
+        finally:
+            tracer = _tracer
+            if tracer is not None and _connected.at is not None:
+                tracer.complete("tls", "phase", _connected.at, time.perf_counter(), {"host": self.host})
+    return connect
+
+def traced_getresponse(original):
+    def getresponse(self, *args, **kwargs):
+        with span("ttfb", "phase", host=self.host):
+            return original(self, *args, **kwargs)
+    return getresponse
+
+def add_aiohttp_phases(trace_config):
+    """
+    Adds the dns, connect (TCP and TLS, aiohttp doesn't separate them) and ttfb phases to an aiohttp TraceConfig.
+    """
+    async def request_start(session, context, params):
+        context.host = params.url.host
+
+    def started(attribute):
+        async def callback(session, context, params):
+            setattr(context, attribute, time.perf_counter())
+        return callback
+
+    def ended(attribute, name):
+        async def callback(session, context, params):
+            start = getattr(context, attribute, None)
+            tracer = _tracer
+            if tracer is not None and start is not None:
+                tracer.complete(name, "phase", start, time.perf_counter(), {"host": getattr(context, "host", None)})
+        return callback
+
+    trace_config.on_request_start.append(request_start)
+    trace_config.on_dns_resolvehost_start.append(started("dns_start"))
+    trace_config.on_dns_resolvehost_end.append(ended("dns_start", "dns"))
+    trace_config.on_connection_create_start.append(started("connect_start"))
+    trace_config.on_connection_create_end.append(ended("connect_start", "connect"))
+    trace_config.on_request_headers_sent.append(started("sent"))
+    trace_config.on_request_end.append(ended("sent", "ttfb"))